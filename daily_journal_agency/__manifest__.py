@@ -11,7 +11,7 @@
     'website': "https://www.yourcompany.com",
 
     'category': 'Uncategorized',
-    'version': '17.0.1.0.0',
+    'version': '17.0.1.3.0',
 
     'depends': ['base','sale','mail','contacts','stock','sale_order_commission','purchase','account','web_tree_dynamic_colored_field'],
 
@@ -19,12 +19,24 @@
     'data': [
         'security/ir.model.access.csv',
         'security/security.xml',
+        'data/ir_cron.xml',
         'views/views.xml',
         'views/menu.xml',
         'views/create_sale_order.xml',
         'views/create_purchase_order.xml',
         'views/create_delivery.xml',
         'views/create_receipt.xml',
+        'views/close_day.xml',
+        'views/close_day_job.xml',
+        'views/commission_rollup.xml',
+        'wizard/journal_import_views.xml',
+        'views/day_summary.xml',
     ],
+    'assets': {
+        'web.assets_backend': [
+            'daily_journal_agency/static/src/day_summary/day_summary.js',
+            'daily_journal_agency/static/src/day_summary/day_summary.xml',
+        ],
+    },
 
 }
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from odoo import http
+from odoo.http import request
+
+
+class DailyJournalController(http.Controller):
+
+    @http.route('/daily_journal_agency/summary', type='json', auth='user')
+    def day_summary(self, date=None):
+        return request.env['daily.journal.agency'].get_day_summary(date)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Backfill the now stored per-day line index in one statement."""
+    cr.execute("""
+        UPDATE daily_journal_agency d
+           SET index = r.rn
+          FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY date ORDER BY id) AS rn
+                  FROM daily_journal_agency
+               ) r
+         WHERE d.id = r.id
+    """)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Create and fill the denormalized customer/farmer/product/commission
+    columns in bulk, so the ORM does not recompute them line by line when
+    they become stored."""
+    cr.execute("""
+        ALTER TABLE daily_journal_agency
+            ADD COLUMN IF NOT EXISTS customer_id int4,
+            ADD COLUMN IF NOT EXISTS farmer int4,
+            ADD COLUMN IF NOT EXISTS product_id int4,
+            ADD COLUMN IF NOT EXISTS commission_value int4
+    """)
+    cr.execute("""
+        UPDATE daily_journal_agency line
+           SET customer_id = cc.partner_id,
+               farmer = fc.partner_id,
+               product_id = pc.product_id,
+               commission_value = categ.commission_value
+          FROM daily_journal_agency j
+     LEFT JOIN customer_codes cc ON cc.id = j.customer_code
+     LEFT JOIN farmer_codes fc ON fc.id = j.farmer_code
+     LEFT JOIN product_code pc ON pc.id = j.product_code
+     LEFT JOIN product_product product ON product.id = pc.product_id
+     LEFT JOIN product_template template ON template.id = product.product_tmpl_id
+     LEFT JOIN product_category categ ON categ.id = template.categ_id
+         WHERE line.id = j.id
+    """)
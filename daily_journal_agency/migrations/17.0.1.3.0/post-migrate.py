@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Box balances are now maintained by deltas on validation, which no
+    longer repairs stale or missing lines: rebuild them once from the moves
+    history as the starting point."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['box.type.product']._rebuild_balances()
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    """Merge the duplicated box balances before the unique (partner_id,
+    product_id) constraint is added: the balances are rebuilt from the
+    moves history after the update anyway."""
+    cr.execute("""
+        DELETE FROM box_type_product b
+         USING box_type_product keep
+         WHERE keep.partner_id = b.partner_id
+           AND keep.product_id = b.product_id
+           AND keep.id < b.id
+    """)
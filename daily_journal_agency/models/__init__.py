@@ -2,4 +2,6 @@
 
 from . import models
 from . import purchase_discount
-from . import res_partner
\ No newline at end of file
+from . import res_partner
+from . import close_day_job
+from . import commission_rollup
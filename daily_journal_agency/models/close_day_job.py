@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from odoo import models, fields, api, _
+from odoo.osv import expression
+
+_logger = logging.getLogger(__name__)
+
+
+class DailyJournalCloseJob(models.Model):
+    _name = 'daily.journal.close.job'
+    _description = 'Daily Journal Close Job'
+    _order = 'id desc'
+
+    name = fields.Char(default=lambda self: _("Close day %s", fields.Date.today()), required=True)
+    user_id = fields.Many2one('res.users', string="Requested By", default=lambda self: self.env.user, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='pending', required=True, readonly=True)
+    date_from = fields.Date(default=fields.Date.context_today, required=True)
+    date_to = fields.Date(default=fields.Date.context_today, required=True)
+    chunk_size = fields.Integer(default=500, required=True)
+    lines_total = fields.Integer(string="Lines To Process", readonly=True)
+    lines_done = fields.Integer(string="Lines Processed", readonly=True)
+    progress = fields.Float(compute='_compute_progress')
+    date_started = fields.Datetime(readonly=True)
+    date_finished = fields.Datetime(readonly=True)
+    message = fields.Text(readonly=True)
+
+    @api.depends('lines_total', 'lines_done')
+    def _compute_progress(self):
+        for job in self:
+            # lines added while the job runs are processed too
+            job.progress = min(100.0, 100.0 * job.lines_done / job.lines_total) if job.lines_total else 0.0
+
+    def _pending_domain(self):
+        """Lines still missing at least one document. The `is_*_created`
+        flags are the checkpoint: lines processed by a committed chunk never
+        come back, so a crashed job simply resumes from the remaining ones."""
+        Journal = self.env['daily.journal.agency']
+        return expression.OR([
+            Journal._pending_lines_domain(flag, self.date_from, self.date_to)
+            for __, flag, __ in Journal._close_day_stages()
+        ])
+
+    @api.model
+    def _cron_process_jobs(self):
+        # running jobs were interrupted (worker killed, timeout): resume them
+        for job in self.search([('state', 'in', ('pending', 'running'))], order='id'):
+            job._run()
+
+    def _run(self):
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Journal = self.env['daily.journal.agency']
+        domain = self._pending_domain()
+        if self.state == 'pending':
+            self.write({
+                'state': 'running',
+                'date_started': fields.Datetime.now(),
+                'lines_total': Journal.search_count(domain),
+                'lines_done': 0,
+            })
+        if auto_commit:
+            self.env.cr.commit()
+
+        try:
+            while True:
+                lines = Journal.search(domain, order='id', limit=self.chunk_size)
+                if not lines:
+                    break
+                stats = Journal._close_day([('id', 'in', lines.ids)], self.date_from, self.date_to)
+                self.write({
+                    'lines_done': self.lines_done + len(lines),
+                    'message': "\n".join(
+                        "%(stage)s: %(count)s records, %(duration).2fs, %(queries)s queries" % stage
+                        for stage in stats
+                    ),
+                })
+                if auto_commit:
+                    self.env.cr.commit()
+                self.env.invalidate_all()
+        except Exception as e:
+            if not auto_commit:
+                raise
+            self.env.cr.rollback()
+            _logger.exception("Daily journal close job %s failed", self.id)
+            self.write({
+                'state': 'failed',
+                'date_finished': fields.Datetime.now(),
+                'message': str(e),
+            })
+            self._notify_user(_("Closing the day failed: %s", e), 'danger')
+            self.env.cr.commit()
+            return
+
+        self.write({'state': 'done', 'date_finished': fields.Datetime.now()})
+        self._notify_user(_("%s journal lines processed.", self.lines_done), 'success')
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _notify_user(self, message, notification_type):
+        self.env['bus.bus']._sendone(self.user_id.partner_id, 'simple_notification', {
+            'title': self.name,
+            'message': message,
+            'type': notification_type,
+            'sticky': notification_type == 'danger',
+        })
+
+    def action_retry(self):
+        self.filtered(lambda job: job.state == 'failed').write({'state': 'pending'})
+        self.env.ref('daily_journal_agency.ir_cron_daily_journal_close_job')._trigger()
@@ -1,64 +1,418 @@
 # -*- coding: utf-8 -*-
+import logging
+import threading
+import time
 from collections import defaultdict
-from odoo import models, fields, api
+from contextlib import contextmanager
+from odoo import models, fields, api, tools, Command
+from odoo.osv import expression
+from odoo.tools import SQL, create_index
 from datetime import date
 
+_logger = logging.getLogger(__name__)
+
+# (dbname, uid, company ids, lang, date) -> (day version, summary) of the
+# days summarized by get_day_summary, oldest first
+day_summary_cache = {}
+day_summary_lock = threading.Lock()
+DAY_SUMMARY_CACHE_SIZE = 64
+
+# (dbname, code model, company id, code) -> (code model version, resolution)
+# of the codes resolved by JournalCodeMixin._resolve_code, oldest first
+code_cache = {}
+code_cache_lock = threading.Lock()
+CODE_CACHE_SIZE = 20000
+
+
+class JournalCodeMixin(models.AbstractModel):
+    """Code typed by the clerks in the journal, resolved to its target record.
+
+    Exact codes are resolved through an in-process cache, invalidated in all
+    workers by a per-model version bumped when codes change; prefix matches
+    use a `text_pattern_ops` btree index and infix matches the trigram index.
+    """
+    _name = 'journal.code.mixin'
+    _description = 'Journal Code'
+    _rec_name = 'code'
+
+    # many2one field the code points to
+    _code_target_field = None
+    # (code field, denormalized target column) on daily.journal.agency
+    _journal_fields = None
+
+    code = fields.Char(index='trigram')
+
+    def init(self):
+        if self._abstract:
+            return
+        create_index(self._cr, f'{self._table}_code_pattern_idx',
+                     self._table, ['code text_pattern_ops'])
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS journal_code_version (
+                model varchar PRIMARY KEY,
+                version integer NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _code_versions(self):
+        """{code model: version}, read once per transaction."""
+        data = self.env.cr.precommit.data
+        if 'daily_journal_agency.code_versions' not in data:
+            self._cr.execute("SELECT model, version FROM journal_code_version")
+            data['daily_journal_agency.code_versions'] = dict(self._cr.fetchall())
+        return data['daily_journal_agency.code_versions']
+
+    @api.model
+    def _bump_code_version(self):
+        """Invalidate the cached resolutions of the model in every worker,
+        once the transaction commits."""
+        versions = self._code_versions()
+        self._cr.execute("""
+            INSERT INTO journal_code_version (model, version) VALUES (%s, 1)
+            ON CONFLICT (model) DO UPDATE SET version = journal_code_version.version + 1
+            RETURNING version
+        """, [self._name])
+        versions[self._name] = self._cr.fetchone()[0]
+        self.env.cr.precommit.data.setdefault('daily_journal_agency.bumped_code_models', set()).add(self._name)
+
+    @api.model
+    def _resolve_code(self, code):
+        """Resolution of the exact `code` (see `_read_code`), or None."""
+        key = (self._cr.dbname, self._name, self.env.company.id, code)
+        version = self._code_versions().get(self._name, 0)
+        with code_cache_lock:
+            cached = code_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        resolved = self._read_code(code)
+        if self._name in self.env.cr.precommit.data.get('daily_journal_agency.bumped_code_models', ()):
+            # resolved from uncommitted changes, which may still roll back
+            return resolved
+        with code_cache_lock:
+            code_cache.pop(key, None)
+            code_cache[key] = (version, resolved)
+            while len(code_cache) > CODE_CACHE_SIZE:
+                code_cache.pop(next(iter(code_cache)))
+        return resolved
+
+    @api.model
+    def _read_code(self, code):
+        """(code id, target id) of the exact `code`, or None. Codes are
+        shared by all users: read as superuser, like the related fields of
+        the journal, so that the cached result does not depend on the
+        record rules of whoever resolved it first."""
+        record = self.sudo().search([('code', '=', code)], limit=1)
+        if not record:
+            return None
+        return record.id, record[self._code_target_field].id
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        if not name or operator not in ('ilike', 'like', '='):
+            return super()._name_search(name, domain, operator, limit, order)
+        domain = domain or []
+        ids = []
+        if not domain:
+            resolved = self._resolve_code(name)
+            if resolved:
+                ids.append(resolved[0])
+        if operator == '=':
+            return ids if not domain else self.search(
+                expression.AND([domain, [('code', '=', name)]]), limit=limit, order=order).ids
+        for match_domain in (
+            [('code', '=like', tools.escape_psql(name) + '%')],
+            [('code', operator, name)],
+        ):
+            if limit and len(ids) >= limit:
+                break
+            ids += self.search(
+                expression.AND([domain, match_domain, [('id', 'not in', ids)]]),
+                limit=limit and limit - len(ids), order=order,
+            ).ids
+        return ids
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._bump_code_version()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'code' in vals or self._code_target_field in vals:
+            self._bump_code_version()
+        if self._journal_fields and self._code_target_field in vals:
+            self._propagate_to_journal()
+        return res
+
+    def _propagate_to_journal(self):
+        """Re-point the journal lines of the codes with one UPDATE, instead
+        of letting the ORM recompute the stored related column line by line."""
+        code_field, target_field = self._journal_fields
+        Journal = self.env['daily.journal.agency']
+        self.flush_recordset([self._code_target_field])
+        self._cr.execute(f"""
+            UPDATE daily_journal_agency line
+               SET "{target_field}" = code."{self._code_target_field}",
+                   write_uid = %s,
+                   write_date = (now() at time zone 'UTC')
+              FROM "{self._table}" code
+             WHERE code.id = line."{code_field}" AND code.id = ANY(%s)
+         RETURNING line.id, line.date
+        """, [self.env.uid, self.ids])
+        rows = self._cr.fetchall()
+        Journal._bump_day_version([line_date for __, line_date in rows])
+        lines = Journal.browse([line_id for line_id, __ in rows])
+        self.env.remove_to_compute(Journal._fields[target_field], lines)
+        # fields depending on the target (e.g. the commission) recompute from the new value
+        lines.invalidate_recordset([target_field, 'write_uid', 'write_date'])
+
+    def unlink(self):
+        res = super().unlink()
+        self._bump_code_version()
+        return res
+
+
 class CustomerCodes(models.Model):
     _name = 'customer.codes'
-    _rec_name = 'code'
+    _inherit = 'journal.code.mixin'
+    _description = 'Customer Code'
+    _code_target_field = 'partner_id'
+    _journal_fields = ('customer_code', 'customer_id')
 
     partner_id = fields.Many2one('res.partner', string="Customer",domain=lambda self: [('is_company', '=', False)])
-    code = fields.Char()
     _sql_constraints = [
         ('code_uniq', 'unique(code)', 'Code already exists for another customer!'),
     ]
 class FarmerCodes(models.Model):
     _name = 'farmer.codes'
-    _rec_name = 'code'
+    _inherit = 'journal.code.mixin'
+    _description = 'Farmer Code'
+    _code_target_field = 'partner_id'
+    _journal_fields = ('farmer_code', 'farmer')
 
     partner_id = fields.Many2one('res.partner', string="Farmer",domain=lambda self: [('is_company', '=', True)])
-    code = fields.Char()
     _sql_constraints = [
         ('code_uniq', 'unique(code)', 'Code already exists for another farmer!'),
     ]
 class ProductCode(models.Model):
     _name = 'product.code'
-    _rec_name = 'code'
+    _inherit = 'journal.code.mixin'
+    _description = 'Product Code'
+    _code_target_field = 'product_id'
+    _journal_fields = ('product_code', 'product_id')
 
     product_id = fields.Many2one('product.product', string="Product", required=True)
-    code = fields.Char()
     _sql_constraints = [
         ('code_uniq', 'unique(code)', 'Code already exists for another product!'),
     ]
+
+    @api.model
+    def _read_code(self, code):
+        """(code id, product id, commission) of the exact `code`, or None."""
+        record = self.sudo().search([('code', '=', code)], limit=1)
+        if not record:
+            return None
+        return record.id, record.product_id.id, record.product_id.categ_id.commission_value
+
+
+class ProductCategory(models.Model):
+    _inherit = 'product.category'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'commission_value' in vals:
+            # resolved product codes carry the commission
+            self.env['product.code']._bump_code_version()
+            # the stored commission of the journal lines is recomputed
+            self.env['daily.journal.agency']._bump_day_version()
+        return res
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'categ_id' in vals:
+            self.env['product.code']._bump_code_version()
+            self.env['daily.journal.agency']._bump_day_version()
+        return res
+
+
 class DailyJournalAgency(models.Model):
     _name = 'daily.journal.agency'
     _description = 'daily.journal.agency'
     _rec_name = 'date'
-    _order = 'index'
+    _order = 'date asc, index asc, id asc'
     _inherit = ['mail.thread', 'mail.activity.mixin']
 
-    index = fields.Integer(
-        compute='_compute_line_index'
-    )
-
-    def _compute_line_index(self):
-        records = self.search([], order='date asc')  # or whatever order you want
-        for idx, rec in enumerate(records, start=1):
-            rec.index = idx
+    # Position of the line inside its day, assigned once on create.
+    index = fields.Integer(readonly=True, copy=False)
+
+    def init(self):
+        create_index(self._cr, 'daily_journal_agency_date_index_idx',
+                     self._table, ['date', 'index'])
+        # Partial indexes on the pending lines of each document type. The
+        # predicate is the exact clause the ORM generates for (flag, '=', False)
+        # so that PostgreSQL can match it.
+        for flag in ('is_sale_created', 'is_purchase_created', 'is_delivery_order', 'is_receipt_order'):
+            create_index(self._cr, f'daily_journal_agency_{flag}_pending_idx',
+                         self._table, ['date'], where=f'({flag} IS NULL OR {flag} = false)')
+        # version of each day's lines, bumped by every change (see get_day_summary)
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS daily_journal_day_version (
+                date date PRIMARY KEY,
+                version integer NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _bumped_days(self):
+        """Days bumped by the current transaction (None for all days)."""
+        return self.env.cr.precommit.data.setdefault('daily_journal_agency.bumped_days', set())
+
+    @api.model
+    def _bump_day_version(self, dates=None):
+        """Invalidate the day summaries of `dates` (of every day if None) in
+        all workers. The new version is only visible once the transaction
+        commits, together with the lines changes."""
+        bumped = self._bumped_days()
+        if dates is None:
+            bumped.add(None)
+            self._cr.execute("UPDATE daily_journal_day_version SET version = version + 1")
+            return
+        dates = sorted({d for d in dates if d})
+        if dates:
+            bumped.update(dates)
+            # sorted: concurrent bumps lock the rows in the same order
+            self._cr.execute("""
+                INSERT INTO daily_journal_day_version (date, version)
+                SELECT unnest(%s::date[]), 1
+                ON CONFLICT (date) DO UPDATE SET version = daily_journal_day_version.version + 1
+            """, [dates])
+
+    def _assign_line_index(self):
+        """Append the lines at the end of their day: next index after the
+        current maximum of the other lines of the same date."""
+        if not self:
+            return
+        self.flush_model(['date', 'index'])
+        # Serialize the numbering of each day until the end of the
+        # transaction, so that concurrent clerks never get the same index.
+        # Sorted, so that batches spanning several days lock in one order.
+        days = sorted({line.date.toordinal() if line.date else 0 for line in self})
+        self._cr.execute("""
+            SELECT pg_advisory_xact_lock(hashtext('daily_journal_agency.index'), days.day)
+              FROM unnest(%s::int[]) AS days(day)
+        """, [days])
+        # The base of every day is read once, from the top of the
+        # (date, index) index; NULL dates get their own branch so that both
+        # lookups stay plain index scans.
+        self._cr.execute("""
+            UPDATE daily_journal_agency d
+               SET index = COALESCE(b.base, 0) + r.rn
+              FROM (
+                    SELECT j.id, j.date,
+                           ROW_NUMBER() OVER (PARTITION BY j.date ORDER BY j.id) AS rn
+                      FROM daily_journal_agency j
+                     WHERE j.id = ANY(%(ids)s)
+                   ) r
+         LEFT JOIN (
+                    SELECT x.date, (
+                               SELECT m.index
+                                 FROM daily_journal_agency m
+                                WHERE m.date = x.date AND m.index IS NOT NULL
+                                  AND m.id != ALL(%(ids)s)
+                             ORDER BY m.index DESC
+                                LIMIT 1
+                           ) AS base
+                      FROM (
+                            SELECT DISTINCT date
+                              FROM daily_journal_agency
+                             WHERE id = ANY(%(ids)s) AND date IS NOT NULL
+                           ) x
+                 UNION ALL
+                    SELECT NULL, (
+                               SELECT m.index
+                                 FROM daily_journal_agency m
+                                WHERE m.date IS NULL AND m.index IS NOT NULL
+                                  AND m.id != ALL(%(ids)s)
+                             ORDER BY m.index DESC
+                                LIMIT 1
+                           )
+                     WHERE %(with_null)s
+                   ) b ON b.date IS NOT DISTINCT FROM r.date
+             WHERE d.id = r.id
+        """, {'ids': list(self.ids), 'with_null': not all(self.mapped('date'))})
+        self.invalidate_recordset(['index'])
+
+    @api.model
+    def _renumber_line_index(self, dates):
+        """Close the gaps left in the given days, keeping the lines order."""
+        dates = set(dates)
+        if not dates:
+            return
+        self.flush_model(['date', 'index'])
+        self._cr.execute("""
+            UPDATE daily_journal_agency d
+               SET index = r.rn
+              FROM (
+                    SELECT id,
+                           ROW_NUMBER() OVER (PARTITION BY date ORDER BY index, id) AS rn
+                      FROM daily_journal_agency
+                     WHERE date = ANY(%(dates)s) OR (date IS NULL AND %(with_null)s)
+                   ) r
+             WHERE d.id = r.id AND d.index IS DISTINCT FROM r.rn
+        """, {'dates': [d for d in dates if d], 'with_null': False in dates or None in dates})
+        self.invalidate_model(['index'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._assign_line_index()
+        self._bump_day_version(records.mapped('date'))
+        return records
+
+    def write(self, vals):
+        if 'date' not in vals:
+            res = super().write(vals)
+            self._bump_day_version(self.mapped('date'))
+            return res
+        # undated lines hold False, to_date() gives None
+        new_date = fields.Date.to_date(vals['date']) or False
+        moved = self.filtered(lambda line: line.date != new_date)
+        old_dates = set(moved.mapped('date'))
+        res = super().write(vals)
+        moved._assign_line_index()
+        self._renumber_line_index(old_dates)
+        # the rollup refresh only sees the new day of the moved lines
+        self.env['daily.journal.commission.rollup']._mark_dirty(old_dates)
+        self._bump_day_version(old_dates | set(self.mapped('date')))
+        return res
+
+    def unlink(self):
+        dates = set(self.mapped('date'))
+        res = super().unlink()
+        self._renumber_line_index(dates)
+        self.env['daily.journal.commission.rollup']._mark_dirty(dates)
+        self._bump_day_version(dates)
+        return res
 
     customer_code = fields.Many2one('customer.codes', string="Customer Code",required=True)
     customer_id = fields.Many2one(
         'res.partner',
         string="Customer",
-        required=True,
         related='customer_code.partner_id',
+        store=True,
+        index=True,
     )
     farmer_code = fields.Many2one('farmer.codes', string="Farmer Code",required=True)
     farmer = fields.Many2one(
         'res.partner',
         string="Farmer",
-        required=True,
         related='farmer_code.partner_id',
+        store=True,
+        index=True,
     )
 
     purchase_order = fields.Char(string="Purchase Order" ,readonly=True)
@@ -66,10 +420,11 @@ class DailyJournalAgency(models.Model):
     sale_order = fields.Char( string="Sale Order",readonly=True)
 
     product_code = fields.Many2one('product.code', string="Product Code",required=True)
-    product_id = fields.Many2one('product.product', related='product_code.product_id', string="Product", required=True)
+    product_id = fields.Many2one('product.product', related='product_code.product_id', string="Product", required=True,
+                                 store=True, index=True)
     box_type = fields.Many2one('product.product', string="Box Type", required=True,domain=[('categ_id.is_service', '=', True)])
     box_type_qty = fields.Float(string="Box Quantity",default=1)
-    commission_value = fields.Integer(string="Commission",related='product_id.categ_id.commission_value')
+    commission_value = fields.Integer(string="Commission",related='product_id.categ_id.commission_value', store=True)
     price_unit = fields.Float(string="Unit Price")
     quantity = fields.Float(string="Quantity",default=1)
     number_of_boxes = fields.Integer(string="Incoming")
@@ -80,149 +435,334 @@ class DailyJournalAgency(models.Model):
     is_receipt_order=fields.Boolean(default=False)
 
 
-    def action_create_sale_orders_today(self):
-        transaction_lines = self.env['daily.journal.agency'].search([('is_sale_created','=',False)])
-        grouped_by_customer = defaultdict(list)
-        for line in transaction_lines:
-            customer_id = line.customer_id.id
-            grouped_by_customer[customer_id].append(line)
-
-        SaleOrder = self.env['sale.order']
-        SaleOrderLine = self.env['sale.order.line']
-
-        for customer_id, lines in grouped_by_customer.items():
-            print("customer_id", customer_id)
-            print("lines", lines)
-            sale_order = SaleOrder.create({
-                'partner_id': customer_id,
-            })
-
-            for line in lines:
-                SaleOrderLine.create({
-                    'order_id': sale_order.id,
-                    'product_id': line.product_id.id,
-                    'product_uom_qty': line.quantity,
-                    'price_unit': line.price_unit,
-                    'commission_value': line.commission_value
-                })
-                line.is_sale_created = True
+    def action_create_sale_orders_today(self, date_from=None, date_to=None):
+        transaction_lines = self.env['daily.journal.agency'].search(
+            self._pending_lines_domain('is_sale_created', date_from, date_to))
+        transaction_lines._prefetch_document_data()._create_sale_orders()
         return True
 
-    def action_create_purchase_orders_today(self):
-        transaction_lines = self.env['daily.journal.agency'].search([('is_purchase_created','=',False)])
-        grouped_by_customer = defaultdict(list)
-
-        for line in transaction_lines:
-            farmer_id = line.farmer.id
-            grouped_by_customer[farmer_id].append(line)
-
-        PurchaseOrder = self.env['purchase.order']
-        PurchaseOrderLine = self.env['purchase.order.line']
-
-        for customer_id, lines in grouped_by_customer.items():
-            purchase_order = PurchaseOrder.create({
-                'partner_id': customer_id,
-            })
-
-            for line in lines:
-                PurchaseOrderLine.create({
-                    'order_id': purchase_order.id,
-                    'product_id': line.product_id.id,
-                    'product_qty': line.quantity,
-                    'price_unit': line.price_unit,
-                })
-                line.is_purchase_created = True
-
+    def action_create_purchase_orders_today(self, date_from=None, date_to=None):
+        transaction_lines = self.env['daily.journal.agency'].search(
+            self._pending_lines_domain('is_purchase_created', date_from, date_to))
+        transaction_lines._prefetch_document_data()._create_purchase_orders()
         return True
 
-    def action_create_delivery_today_records(self):
-        StockPicking = self.env['stock.picking']
-        StockMove = self.env['stock.move']
-
-        transaction_lines = self.env['daily.journal.agency'].search([
-            ('is_delivery_order', '=', False),
-        ])
-
-        if not transaction_lines:
-            return True
-
-        picking_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'outgoing'),
-            ('warehouse_id.company_id', '=', self.env.company.id)
-        ], limit=1)
-
-        source_loc = picking_type.default_location_src_id or picking_type.warehouse_id.lot_stock_id
-        dest_loc = picking_type.default_location_dest_id or self.env.ref('stock.stock_location_customers')
-
-        grouped_by_customer = defaultdict(list)
-        for line in transaction_lines:
-            grouped_by_customer[line.customer_id.id].append(line)
-
-        for partner_id, lines in grouped_by_customer.items():
-            partner = self.env['res.partner'].browse(partner_id)
-            picking = StockPicking.create({
-                'partner_id': partner.id,
-                'picking_type_id': picking_type.id,
-                'location_id': source_loc.id,
-                'location_dest_id': dest_loc.id,
-                'origin': f"Daily Journal {fields.Date.today()}",
-            })
-            for line in lines:
-                StockMove.create({
-                    'name': line.box_type.display_name,
-                    'product_id': line.box_type.id,
-                    'product_uom_qty': line.box_type_qty,
-                    'product_uom': line.box_type.uom_id.id,
-                    'picking_id': picking.id,
-                    'location_id': source_loc.id,
-                    'location_dest_id': dest_loc.id,
-                })
-                line.write({'is_delivery_order': True})
+    def action_create_delivery_today_records(self, date_from=None, date_to=None, confirm=False):
+        transaction_lines = self.env['daily.journal.agency'].search(
+            self._pending_lines_domain('is_delivery_order', date_from, date_to))
+        transaction_lines._prefetch_document_data()._create_delivery_orders(confirm=confirm)
         return True
 
-    def action_create_receipt_today_records(self):
+    def action_create_receipt_today_records(self, date_from=None, date_to=None, confirm=False):
+        transaction_lines = self.env['daily.journal.agency'].search(
+            self._pending_lines_domain('is_receipt_order', date_from, date_to))
+        transaction_lines._prefetch_document_data()._create_receipt_orders(confirm=confirm)
+        return True
 
-        transaction_lines = self.env['daily.journal.agency'].search([
-            ('is_receipt_order', '=', False),
+    # partner of the document tracked by each pending flag
+    _pending_partner_fields = {
+        'is_sale_created': 'customer_id',
+        'is_purchase_created': 'farmer',
+        'is_delivery_order': 'customer_id',
+        'is_receipt_order': 'farmer',
+    }
+
+    @api.model
+    def _pending_lines_domain(self, flag, date_from=None, date_to=None, with_partner=True):
+        """Lines of the given period (today by default) still missing the
+        document tracked by `flag`. Lines whose code has no partner cannot
+        get that document: they are left out, or only those are returned
+        when `with_partner` is False."""
+        return [
+            (flag, '=', False),
+            (self._pending_partner_fields[flag], '!=' if with_partner else '=', False),
+            ('date', '>=', date_from or fields.Date.context_today(self)),
+            ('date', '<=', date_to or date_from or fields.Date.context_today(self)),
+        ]
+
+    def action_close_day(self, date_from=None, date_to=None):
+        """Generate sale orders, purchase orders, deliveries and receipts for
+        all pending lines of the period in one go and report where the time
+        was spent."""
+        stats = self._close_day(date_from=date_from, date_to=date_to)
+        message = "\n".join(
+            "%(stage)s: %(count)s records, %(duration).2fs, %(queries)s queries" % stage
+            for stage in stats
+        )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': "Day closed",
+                'message': message,
+                'sticky': True,
+                'type': 'success',
+            },
+        }
+
+    def action_close_day_background(self, date_from=None, date_to=None):
+        """Queue the day closing on the cron worker instead of running it
+        inside the current request."""
+        vals = {}
+        if date_from:
+            vals.update(date_from=date_from, date_to=date_to or date_from)
+        job = self.env['daily.journal.close.job'].create(vals)
+        self.env.ref('daily_journal_agency.ir_cron_daily_journal_close_job')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'daily.journal.close.job',
+            'res_id': job.id,
+            'view_mode': 'form',
+        }
+
+    @api.model
+    def _close_day_stages(self):
+        """(label, pending flag, generator) of every document type produced
+        when closing the day, in generation order."""
+        return [
+            ("Sale orders", 'is_sale_created', '_create_sale_orders'),
+            ("Purchase orders", 'is_purchase_created', '_create_purchase_orders'),
+            ("Deliveries", 'is_delivery_order', '_create_delivery_orders'),
+            ("Receipts", 'is_receipt_order', '_create_receipt_orders'),
+        ]
+
+    @api.model
+    def _close_day(self, domain=None, date_from=None, date_to=None):
+        """Load the pending lines of the period once and emit every document
+        type from them.
+
+        :return: list of dicts with the stage label, number of records
+                 loaded or created, duration in seconds and SQL queries
+        """
+        stages = self._close_day_stages()
+        pending_domain = expression.OR([
+            self._pending_lines_domain(flag, date_from, date_to) for __, flag, __ in stages
         ])
+        stats = []
+
+        with self._close_day_stage(stats, "Loading lines") as stage:
+            transaction_lines = self.search(expression.AND([domain or [], pending_domain]))
+            transaction_lines._prefetch_document_data()
+            stage['count'] = len(transaction_lines)
+
+        with self._close_day_stage(stats, "Skipped lines without customer or farmer") as stage:
+            stage['count'] = self.search_count(expression.AND([domain or [], expression.OR([
+                self._pending_lines_domain(flag, date_from, date_to, with_partner=False) for __, flag, __ in stages
+            ])]))
+            if stage['count']:
+                _logger.warning("Close day: %s lines skipped, their code has no customer or farmer", stage['count'])
+
+        for label, flag, method in stages:
+            with self._close_day_stage(stats, label) as stage:
+                lines = transaction_lines.filtered(lambda line: not line[flag])
+                stage['count'] = len(getattr(lines, method)())
+
+        for stage in stats:
+            _logger.info("Close day - %(stage)s: %(count)s records in %(duration).3fs (%(queries)s queries)", stage)
+        return stats
+
+    @contextmanager
+    def _close_day_stage(self, stats, label):
+        cr = self.env.cr
+        stage = {'stage': label, 'count': 0}
+        start_queries = cr.sql_log_count
+        start = time.perf_counter()
+        yield stage
+        self.env.flush_all()
+        stage['duration'] = time.perf_counter() - start
+        stage['queries'] = cr.sql_log_count - start_queries
+        stats.append(stage)
+
+    def _prefetch_document_data(self):
+        """Load, for the whole recordset at once, everything the document
+        generators read from the journal lines."""
+        self.fetch(['customer_id', 'farmer', 'product_id', 'commission_value', 'box_type', 'box_type_qty',
+                    'price_unit', 'quantity', 'is_sale_created', 'is_purchase_created',
+                    'is_delivery_order', 'is_receipt_order'])
+        self.box_type.fetch(['uom_id'])
+        self.box_type.mapped('display_name')
+        return self
+
+    def _group_by_partner(self, partner_field):
+        grouped = defaultdict(list)
+        for line in self:
+            grouped[line[partner_field].id].append(line)
+        return grouped
+
+    def _prepare_sale_order_line_vals(self, sale_order):
+        self.ensure_one()
+        return {
+            'order_id': sale_order.id,
+            'product_id': self.product_id.id,
+            'product_uom_qty': self.quantity,
+            'price_unit': self.price_unit,
+            'commission_value': self.commission_value,
+        }
+
+    def _create_sale_orders(self):
+        """Create one sale order per customer for the lines in `self`, with
+        a single create per model and a single write on the journal lines."""
+        if not self:
+            return self.env['sale.order']
+        grouped_by_customer = self._group_by_partner('customer_id')
+
+        sale_orders = self.env['sale.order'].create([
+            {'partner_id': customer_id} for customer_id in grouped_by_customer
+        ])
+        self.env['sale.order.line'].create([
+            line._prepare_sale_order_line_vals(sale_order)
+            for sale_order, lines in zip(sale_orders, grouped_by_customer.values())
+            for line in lines
+        ])
+        self.write({'is_sale_created': True})
+        return sale_orders
+
+    def _create_purchase_orders(self):
+        """Create one purchase order per farmer for the lines in `self`.
+        Once `_prefetch_document_data` has run, the number of queries does
+        not depend on the number of lines."""
+        if not self:
+            return self.env['purchase.order']
+        grouped_by_farmer = self._group_by_partner('farmer')
+
+        purchase_orders = self.env['purchase.order'].create([
+            {'partner_id': farmer_id} for farmer_id in grouped_by_farmer
+        ])
+        self.env['purchase.order.line'].create([
+            {
+                'order_id': purchase_order.id,
+                'product_id': line.product_id.id,
+                'product_qty': line.quantity,
+                'price_unit': line.price_unit,
+            }
+            for purchase_order, lines in zip(purchase_orders, grouped_by_farmer.values())
+            for line in lines
+        ])
+        self.write({'is_purchase_created': True})
+        return purchase_orders
 
-        if not transaction_lines:
-            return True
+    def _create_pickings(self, picking_code, partner_field, origin, pending_flag, confirm=False):
+        """Create one picking per partner with all its box moves, through a
+        single nested create, and flag the lines with a single write.
+        With `confirm`, the pickings are confirmed and reserved in batch."""
+        StockPicking = self.env['stock.picking']
+        if not self:
+            return StockPicking
 
         picking_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'incoming'),
+            ('code', '=', picking_code),
             ('warehouse_id.company_id', '=', self.env.company.id)
         ], limit=1)
 
-        source_loc = picking_type.default_location_src_id or self.env.ref('stock.stock_location_suppliers')
-        dest_loc = picking_type.default_location_dest_id or picking_type.warehouse_id.lot_stock_id
+        if picking_code == 'outgoing':
+            source_loc = picking_type.default_location_src_id or picking_type.warehouse_id.lot_stock_id
+            dest_loc = picking_type.default_location_dest_id or self.env.ref('stock.stock_location_customers')
+        else:
+            source_loc = picking_type.default_location_src_id or self.env.ref('stock.stock_location_suppliers')
+            dest_loc = picking_type.default_location_dest_id or picking_type.warehouse_id.lot_stock_id
 
-        grouped_by_farmer = defaultdict(list)
-        for line in transaction_lines:
-            grouped_by_farmer[line.farmer.id].append(line)
+        # box type names and units for the whole batch
+        self.box_type.fetch(['uom_id'])
+        self.box_type.mapped('display_name')
 
-        for farmer_id, lines in grouped_by_farmer.items():
-            partner = self.env['res.partner'].browse(farmer_id)
-            picking = self.env['stock.picking'].create({
-                'partner_id': partner.id,
+        pickings = StockPicking.create([
+            {
+                'partner_id': partner_id,
                 'picking_type_id': picking_type.id,
                 'location_id': source_loc.id,
                 'location_dest_id': dest_loc.id,
-                'origin': f"Daily Journal Receipt {fields.Date.today()}",
+                'origin': origin,
+                'move_ids': [
+                    Command.create({
+                        'name': line.box_type.display_name,
+                        'product_id': line.box_type.id,
+                        'product_uom_qty': line.box_type_qty,
+                        'product_uom': line.box_type.uom_id.id,
+                        'location_id': source_loc.id,
+                        'location_dest_id': dest_loc.id,
+                    })
+                    for line in lines
+                ],
+            }
+            for partner_id, lines in self._group_by_partner(partner_field).items()
+        ])
+        self.write({pending_flag: True})
+        if confirm:
+            pickings.action_confirm()
+            pickings.action_assign()
+        return pickings
+
+    def _create_delivery_orders(self, confirm=False):
+        return self._create_pickings(
+            'outgoing', 'customer_id', f"Daily Journal {fields.Date.today()}",
+            'is_delivery_order', confirm=confirm,
+        )
+
+    def _create_receipt_orders(self, confirm=False):
+        return self._create_pickings(
+            'incoming', 'farmer', f"Daily Journal Receipt {fields.Date.today()}",
+            'is_receipt_order', confirm=confirm,
+        )
+
+    @api.model
+    def get_day_summary(self, day=None):
+        """Quantity, boxes, value and commission of a day per customer and per
+        farmer, from a single aggregate query. The result is cached until a line
+        of that day is created, written or deleted (see _bump_day_version).
+
+        The lines are filtered by the record rules of the user and the names
+        are localized, so the cache is per user, companies and language."""
+        day = fields.Date.to_date(day) or fields.Date.context_today(self)
+        self.flush_model()
+        self._cr.execute("SELECT version FROM daily_journal_day_version WHERE date = %s", [day])
+        version = (self._cr.fetchone() or (0,))[0]
+        key = (self._cr.dbname, self.env.uid, tuple(self.env.companies.ids), self.env.lang, day)
+        with day_summary_lock:
+            cached = day_summary_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        # value and commission are per-line products, which _read_group
+        # cannot sum: aggregate them in SQL, per customer and per farmer in
+        # one pass, on the lines the user may read
+        self._cr.execute(SQL("""
+            SELECT GROUPING(farmer), COALESCE(customer_id, farmer), COUNT(*),
+                   SUM(quantity), SUM(box_type_qty), SUM(quantity * price_unit),
+                   SUM(quantity * COALESCE(commission_value, 0))
+              FROM daily_journal_agency
+             WHERE date = %s AND id IN (%s)
+          GROUP BY GROUPING SETS ((customer_id), (farmer))
+        """, day, self._search([('date', '=', day)]).subselect()))
+        groups = self._cr.fetchall()
+        partners = self.env['res.partner'].browse({partner_id for __, partner_id, *__ in groups if partner_id})
+        names = dict(zip(partners.ids, partners.mapped('display_name')))
+        totals = {'customers': [], 'farmers': []}
+        for by_customer, partner_id, count, quantity, boxes, value, commission in groups:
+            totals['customers' if by_customer else 'farmers'].append({
+                'id': partner_id or False,
+                'name': names.get(partner_id, ''),
+                'lines': count,
+                'quantity': quantity or 0.0,
+                'boxes': boxes or 0.0,
+                'value': value or 0.0,
+                'commission': commission or 0.0,
             })
-            for line in lines:
-                self.env['stock.move'].create({
-                    'name': line.box_type.display_name,
-                    'product_id': line.box_type.id,
-                    'product_uom_qty': line.box_type_qty,
-                    'product_uom': line.box_type.uom_id.id,
-                    'picking_id': picking.id,
-                    'location_id': source_loc.id,
-                    'location_dest_id': dest_loc.id,
-                })
-                line.write({'is_receipt_order': True})
 
-        return True
+        result = {
+            'date': fields.Date.to_string(day),
+            'customers': sorted(totals['customers'], key=lambda row: row['name'] or ''),
+            'farmers': sorted(totals['farmers'], key=lambda row: row['name'] or ''),
+        }
+        bumped = self._bumped_days()
+        if day in bumped or None in bumped:
+            # computed from uncommitted changes, which may still roll back
+            return result
+        with day_summary_lock:
+            day_summary_cache.pop(key, None)
+            day_summary_cache[key] = (version, result)
+            while len(day_summary_cache) > DAY_SUMMARY_CACHE_SIZE:
+                day_summary_cache.pop(next(iter(day_summary_cache)))
+        return result
 
     def action_copy_line(self):
         self.copy()
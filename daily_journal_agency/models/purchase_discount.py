@@ -1,3 +1,5 @@
+import copy
+
 from odoo import models, fields, api, _
 
 
@@ -9,54 +11,79 @@ class PurchaseOrder(models.Model):
     discount_rate = fields.Monetary(string='Discount Rate', digits=(16, 2), default=8.0, currency_field='currency_id')
 
 
-   
+
+    def _discount_totals_memo(self):
+        return self.env.cr.precommit.data.setdefault('daily_journal_agency.purchase_discount_totals', {})
+
+    def _discount_totals_key(self):
+        self.ensure_one()
+        return (
+            self.id,
+            self.env.lang,
+            self.currency_id.id,
+            self.company_id.id,
+            self.discount_type,
+            self.discount_rate,
+            tuple(
+                (line.id, line.display_type, line.price_unit, line.product_qty, line.discount,
+                 tuple(line.taxes_id.ids), line.price_subtotal, line.price_tax)
+                for line in self.order_line
+            ),
+        )
+
+    def _get_discount_totals(self):
+        """Discount-aware totals of the orders: {order: (tax_totals, amount_untaxed,
+        amount_tax)}. Computed once per recompute cycle and shared by
+        `tax_totals` and the stored amounts: the memo is keyed on every value
+        the totals depend on, and lives until the end of the transaction.
+        Callers get deep copies: the nested tax groups of the memoized
+        totals are never shared."""
+        memo = self._discount_totals_memo()
+        result = {}
+        for order in self:
+            key = order._discount_totals_key()
+            if key not in memo:
+                memo[key] = order._compute_discount_totals()
+            result[order] = copy.deepcopy(memo[key])
+        return result
+
+    def _compute_discount_totals(self):
+        self.ensure_one()
+        order_lines = self.order_line.filtered(lambda x: not x.display_type)
+        currency = self.currency_id or self.company_id.currency_id
+        tax_totals = self.env['account.tax']._prepare_tax_totals(
+            [x._convert_to_tax_base_line_dict() for x in order_lines],
+            currency,
+        )
+
+        if self.company_id.tax_calculation_rounding_method == 'round_globally':
+            amount_untaxed = tax_totals['amount_untaxed']
+            amount_tax = tax_totals['amount_total'] - tax_totals['amount_untaxed']
+        else:
+            amount_untaxed = sum(order_lines.mapped('price_subtotal'))
+            amount_tax = sum(order_lines.mapped('price_tax'))
+
+        discount = 0.0
+        if self.discount_type == 'amount':
+            discount = self.discount_rate
+        elif self.discount_type == 'percent':
+            discount = amount_untaxed * self.discount_rate / 100.0
+
+        tax_totals = dict(tax_totals, amount_untaxed=tax_totals['amount_untaxed'] - discount)
+        return tax_totals, amount_untaxed - discount, amount_tax
 
     @api.depends_context('lang')
     @api.depends('order_line.taxes_id', 'order_line.price_subtotal', 'amount_total', 'amount_untaxed')
     def _compute_tax_totals(self):
-        for order in self:
-            order_lines = order.order_line.filtered(lambda x: not x.display_type)
-            order.tax_totals = self.env['account.tax']._prepare_tax_totals(
-                [x._convert_to_tax_base_line_dict() for x in order_lines],
-                order.currency_id or order.company_id.currency_id,
-            )
-            discount = 0.0
-            if order.discount_type == 'amount':
-                discount = order.discount_rate
-            elif order.discount_type == 'percent':
-                discount = order.tax_totals['amount_untaxed'] * order.discount_rate / 100.0
-            order.tax_totals['amount_untaxed']= order.tax_totals['amount_untaxed'] - discount
-
-
-
- 
+        for order, (tax_totals, __, __) in self._get_discount_totals().items():
+            order.tax_totals = tax_totals
 
     @api.depends('order_line.price_total', 'discount_type', 'discount_rate')
     def _amount_all(self):
-        for order in self:
-            order_lines = order.order_line.filtered(lambda x: not x.display_type)
-
-            if order.company_id.tax_calculation_rounding_method == 'round_globally':
-                tax_results = self.env['account.tax']._compute_taxes([
-                    line._convert_to_tax_base_line_dict()
-                    for line in order_lines
-                ])
-                totals = tax_results['totals']
-                amount_untaxed = totals.get(order.currency_id, {}).get('amount_untaxed', 0.0)
-                amount_tax = totals.get(order.currency_id, {}).get('amount_tax', 0.0)
-            else:
-                amount_untaxed = sum(order_lines.mapped('price_subtotal'))
-                amount_tax = sum(order_lines.mapped('price_tax'))
-
-            discount = 0.0
-            if order.discount_type == 'amount':
-                discount = order.discount_rate
-            elif order.discount_type == 'percent':
-                discount = amount_untaxed * order.discount_rate / 100.0
-
-            order.amount_untaxed = amount_untaxed - discount
+        for order, (__, amount_untaxed, amount_tax) in self._get_discount_totals().items():
+            order.amount_untaxed = amount_untaxed
             order.amount_tax = amount_tax
-            order.amount_total = order.amount_untaxed + order.amount_tax
+            order.amount_total = amount_untaxed + amount_tax
 
 
     def _prepare_invoice(self, ):
@@ -85,33 +112,62 @@ class AccountMove(models.Model):
 
 
 
-    def _supply_rate(self):
-        """This function calculates supply rates based on change of
-        discount_type,
-           discount_rate and invoice_line_ids"""
-        for inv in self:
-            if inv.discount_type == 'percent':
-                for line in inv.invoice_line_ids:
-                   
-                    inv.amount_discount = inv.discount_rate
-                    line._compute_totals()
-            else:
-                total = 0.0
-                print("inv.invoice_line_ids", inv.invoice_line_ids)
-                
-                if inv.discount_rate != 0:
-                    discount = (inv.discount_rate / total) * 100
-                else:
-                    discount = inv.discount_rate
-                for line in inv.invoice_line_ids:
-                    print("line", discount)
-                    line.write({'discount': discount})
-                    print("line.discount", line.discount)
-                    inv.amount_discount = inv.discount_rate
-                    line._compute_totals()
-            inv._compute_tax_totals()
-        def create(self, vals):
-            """Override create method to set default values for discount_type and discount_rate."""
-            self._supply_rate()
-            return super(AccountMove, self).create(vals)
-
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super(AccountMove, self).create(vals_list)
+        # the purchase order passes its discount to the bills it creates,
+        # on the lines without a discount of their own
+        for move, vals in zip(moves, vals_list):
+            if 'discount_rate' in vals:
+                move._supply_rate(move._get_supply_lines().filtered(lambda l: not l.discount))
+        return moves
+
+    def write(self, vals):
+        res = super(AccountMove, self).write(vals)
+        if 'discount_type' in vals or 'discount_rate' in vals:
+            for move in self.filtered(lambda m: m.state == 'draft'):
+                move._supply_rate(move._get_supply_lines().filtered('purchase_discount_applied'))
+        return res
+
+    def _get_supply_lines(self):
+        """Product lines of the bill coming from a purchase order."""
+        self.ensure_one()
+        return self.invoice_line_ids.filtered(lambda l: l.display_type == 'product' and l.purchase_line_id)
+
+    def _get_supply_discount(self, lines):
+        """Line discount (%) matching the bill discount. Amount discounts
+        are the discount of the whole purchase order: prorated against the
+        untaxed total of the orders of `lines`, so that the bills of an
+        order share it instead of each taking all of it."""
+        self.ensure_one()
+        if self.discount_type == 'percent':
+            return self.discount_rate
+        orders = lines.purchase_line_id.order_id
+        total = sum(orders.order_line.filtered(lambda l: not l.display_type).mapped('price_subtotal'))
+        return (self.discount_rate / total) * 100 if total else 0.0
+
+    def _supply_rate(self, lines):
+        """Write the bill discount on `lines`, product lines of the bill
+        coming from a purchase order, in one write; the totals are
+        recomputed once by the ORM. The lines are flagged as carrying the
+        propagated discount: a later change of the bill discount updates
+        them, unless their discount was edited by hand meanwhile."""
+        self.ensure_one()
+        if lines and self.is_purchase_document(include_receipts=True):
+            lines.with_context(purchase_discount_propagation=True).write({
+                'discount': self._get_supply_discount(lines),
+                'purchase_discount_applied': True,
+            })
+
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    purchase_discount_applied = fields.Boolean(
+        copy=False, help="The discount of the line is the bill discount propagated from its purchase order.")
+
+    def write(self, vals):
+        if 'discount' in vals and not self.env.context.get('purchase_discount_propagation'):
+            # edited by hand, including to 0%: no longer follows the bill discount
+            vals = dict(vals, purchase_discount_applied=False)
+        return super().write(vals)
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from odoo import models, fields, api
 
 class ResPartner(models.Model):
@@ -5,15 +7,24 @@ class ResPartner(models.Model):
 
     box_type_ids = fields.One2many('box.type.product', 'partner_id', string='Box Type')
 
+    def action_rebuild_box_balances(self):
+        self.env['box.type.product']._rebuild_balances(self.ids)
+        return True
+
 
 class BoxTypeProduct(models.Model):
     _name = 'box.type.product'
     _description = 'Box Type Product'
 
-    partner_id = fields.Many2one('res.partner', string='Partner')
+    partner_id = fields.Many2one('res.partner', string='Partner', index=True)
     product_id = fields.Many2one('product.product', string='Product')
     quantity = fields.Float()
 
+    _sql_constraints = [
+        ('partner_product_uniq', 'unique(partner_id, product_id)',
+         'A partner can only have one balance per box type!'),
+    ]
+
     def open_product_history(self):
         return {
             'name': 'Product History',
@@ -23,46 +34,124 @@ class BoxTypeProduct(models.Model):
             'type': 'ir.actions.act_window',
         }
 
+    @api.model
+    def _apply_move_lines(self, move_lines):
+        """Add the signed quantities of done box move lines to the partners
+        balances: outgoing boxes increase the balance, incoming ones decrease it."""
+        deltas = defaultdict(float)
+        for move_line in move_lines:
+            partner = move_line.picking_id.partner_id
+            if (not partner or move_line.state != 'done'
+                    or not move_line.product_id.categ_id.is_service
+                    or move_line.picking_code not in ('incoming', 'outgoing')):
+                continue
+            sign = 1 if move_line.picking_code == 'outgoing' else -1
+            deltas[partner.id, move_line.product_id.id] += sign * move_line.quantity
+        self._update_balances(deltas, increment=True)
+
+    @api.model
+    def _update_balances(self, balances, increment=False):
+        """Write {(partner_id, product_id): quantity} with one upsert. With
+        `increment`, quantities are added to the current balances. The
+        unique (partner_id, product_id) constraint makes concurrent
+        validations of the same partner wait for each other instead of
+        overwriting each other or inserting duplicate lines."""
+        if not balances:
+            return
+        keys = list(balances)
+        self.flush_model(['partner_id', 'product_id', 'quantity'])
+        self._cr.execute(f"""
+            INSERT INTO box_type_product (partner_id, product_id, quantity,
+                                          create_uid, create_date, write_uid, write_date)
+            SELECT v.partner_id, v.product_id, v.quantity,
+                   %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::int[], %s::float8[]) AS v(partner_id, product_id, quantity)
+                ON CONFLICT (partner_id, product_id) DO UPDATE
+               SET quantity = {'COALESCE(box_type_product.quantity, 0) + ' if increment else ''}EXCLUDED.quantity,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, [
+            self.env.uid,
+            self.env.uid,
+            [partner_id for partner_id, __ in keys],
+            [product_id for __, product_id in keys],
+            [balances[key] for key in keys],
+        ])
+        self.invalidate_model(['quantity', 'write_uid', 'write_date'])
+
+    @api.model
+    def rebuild_box_balances(self):
+        """Recompute the box balances of all partners. Run nightly by cron,
+        and callable from a shell after data imports::
+
+            env['box.type.product'].rebuild_box_balances()
+        """
+        self._rebuild_balances()
+        return True
+
+    @api.model
+    def _rebuild_balances(self, partner_ids=None):
+        """Recompute the balances from the whole done moves history with one
+        grouped aggregate, for the given partners or for all of them.
+
+        The aggregate is plain SQL: the partner and the operation type of a
+        move line (`picking_partner_id`, `picking_code`) are non-stored related
+        fields, which _read_group cannot group on.
+        """
+        self.env['stock.move.line'].flush_model(['picking_id', 'product_id', 'quantity', 'state'])
+        self.env['stock.picking'].flush_model(['partner_id', 'picking_type_id'])
+        query = """
+            SELECT picking.partner_id, ml.product_id,
+                   SUM(CASE WHEN picking_type.code = 'outgoing' THEN ml.quantity ELSE -ml.quantity END)
+              FROM stock_move_line ml
+              JOIN stock_picking picking ON picking.id = ml.picking_id
+              JOIN stock_picking_type picking_type ON picking_type.id = picking.picking_type_id
+              JOIN product_product product ON product.id = ml.product_id
+              JOIN product_template template ON template.id = product.product_tmpl_id
+              JOIN product_category categ ON categ.id = template.categ_id
+             WHERE ml.state = 'done'
+               AND categ.is_service
+               AND picking_type.code IN ('incoming', 'outgoing')
+               AND picking.partner_id IS NOT NULL
+        """
+        params = []
+        if partner_ids is not None:
+            query += " AND picking.partner_id = ANY(%s)"
+            params.append(list(partner_ids))
+        query += " GROUP BY picking.partner_id, ml.product_id"
+        self._cr.execute(query, params)
+        balances = {
+            (partner_id, product_id): quantity
+            for partner_id, product_id, quantity in self._cr.fetchall()
+        }
+        self._update_balances(balances)
+
+        # reset the lines whose moves are all gone (cancelled, deleted...)
+        self._cr.execute(f"""
+            UPDATE box_type_product b
+               SET quantity = 0,
+                   write_uid = %s,
+                   write_date = (now() at time zone 'UTC')
+             WHERE b.quantity != 0
+               {'AND b.partner_id = ANY(%s)' if partner_ids is not None else ''}
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM unnest(%s::int[], %s::int[]) AS v(partner_id, product_id)
+                     WHERE v.partner_id = b.partner_id AND v.product_id = b.product_id
+               )
+        """, [self.env.uid] + params + [
+            [partner_id for partner_id, __ in balances],
+            [product_id for __, product_id in balances],
+        ])
+        self.invalidate_model(['quantity', 'write_uid', 'write_date'])
+
+
 class StockPicking(models.Model):
     _inherit = 'stock.picking'
 
     def button_validate(self):
+        to_validate = self.filtered(lambda picking: picking.state != 'done')
         res = super(StockPicking, self).button_validate()
-
-        for picking in self:
-            for product in picking.move_ids_without_package.mapped('product_id'):
-                if not product.categ_id.is_service:
-                    continue
-
-                incoming_qty = self.env['stock.move.line'].search([
-                    ('picking_id.partner_id', '=', picking.partner_id.id),
-                    ('product_id', '=', product.id),
-                    ('product_id.categ_id.is_service', '=', True),
-                    ('state', '=', 'done'),
-                    ('picking_code', '=', 'incoming')
-                ]).mapped('quantity')
-                incoming_qty_total = sum(incoming_qty)
-
-                outgoing_qty = self.env['stock.move.line'].search([
-                    ('picking_id.partner_id', '=', picking.partner_id.id),
-                    ('product_id', '=', product.id),
-                    ('product_id.categ_id.is_service', '=', True),
-                    ('state', '=', 'done'),
-                    ('picking_code', '=', 'outgoing')
-                ]).mapped('quantity')
-                outgoing_qty_total = sum(outgoing_qty)
-
-                balance_qty = outgoing_qty_total- incoming_qty_total
-
-                existing_line = picking.partner_id.box_type_ids.filtered(lambda l: l.product_id == product)
-                if existing_line:
-                    existing_line.write({'quantity': balance_qty})
-                else:
-                    self.env['box.type.product'].create({
-                        'partner_id': picking.partner_id.id,
-                        'product_id': product.id,
-                        'quantity': balance_qty
-                    })
-
+        validated = to_validate.filtered(lambda picking: picking.state == 'done')
+        self.env['box.type.product']._apply_move_lines(validated.move_line_ids)
         return res
-
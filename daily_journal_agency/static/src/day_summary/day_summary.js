@@ -0,0 +1,41 @@
+/** @odoo-module **/
+
+import {Component, onWillStart, useState} from "@odoo/owl";
+import {registry} from "@web/core/registry";
+import {useService} from "@web/core/utils/hooks";
+import {formatFloat} from "@web/views/fields/formatters";
+
+/**
+ * Day-close summary: totals of the day per customer and per farmer,
+ * pre-aggregated by the server (see daily.journal.agency.get_day_summary).
+ */
+export class DaySummary extends Component {
+    setup() {
+        this.rpc = useService("rpc");
+        this.state = useState({date: luxon.DateTime.now().toISODate(), summary: null});
+        onWillStart(() => this.load());
+    }
+
+    async load() {
+        this.state.summary = await this.rpc("/daily_journal_agency/summary", {
+            date: this.state.date,
+        });
+    }
+
+    async onDateChange(ev) {
+        this.state.date = ev.target.value;
+        await this.load();
+    }
+
+    format(value) {
+        return formatFloat(value, {digits: [16, 2]});
+    }
+
+    total(rows, key) {
+        return rows.reduce((sum, row) => sum + row[key], 0);
+    }
+}
+
+DaySummary.template = "daily_journal_agency.DaySummary";
+
+registry.category("actions").add("daily_journal_agency.day_summary", DaySummary);
@@ -0,0 +1,4 @@
+from . import test_box_balances
+from . import test_commission_rollup
+from . import test_day_summary
+from . import test_purchase_discount
@@ -0,0 +1,33 @@
+from odoo.tests import TransactionCase
+
+
+class DailyJournalCommon(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.customer = cls.env['res.partner'].create({'name': "Customer"})
+        cls.farmer = cls.env['res.partner'].create({'name': "Farmer", 'is_company': True})
+        cls.category = cls.env['product.category'].create({'name': "Vegetables", 'commission_value': 2})
+        cls.box_category = cls.env['product.category'].create({'name': "Boxes", 'is_service': True})
+        cls.product = cls.env['product.product'].create({'name': "Tomatoes", 'categ_id': cls.category.id})
+        cls.box = cls.env['product.product'].create({
+            'name': "Box",
+            'type': 'consu',
+            'categ_id': cls.box_category.id,
+        })
+        cls.customer_code = cls.env['customer.codes'].create({'code': 'C1', 'partner_id': cls.customer.id})
+        cls.farmer_code = cls.env['farmer.codes'].create({'code': 'F1', 'partner_id': cls.farmer.id})
+        cls.product_code = cls.env['product.code'].create({'code': 'P1', 'product_id': cls.product.id})
+
+    def _create_line(self, **vals):
+        return self.env['daily.journal.agency'].create({
+            'customer_code': self.customer_code.id,
+            'farmer_code': self.farmer_code.id,
+            'product_code': self.product_code.id,
+            'box_type': self.box.id,
+            'box_type_qty': 1.0,
+            'quantity': 10.0,
+            'price_unit': 5.0,
+            **vals,
+        })
@@ -0,0 +1,46 @@
+from odoo.tests import tagged
+
+from .common import DailyJournalCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBoxBalances(DailyJournalCommon):
+
+    def _balances(self):
+        return self.env['box.type.product'].search([('partner_id', '=', self.customer.id)])
+
+    def test_update_balances_upsert(self):
+        BoxTypeProduct = self.env['box.type.product']
+        BoxTypeProduct._update_balances({(self.customer.id, self.box.id): 5.0}, increment=True)
+        BoxTypeProduct._update_balances({(self.customer.id, self.box.id): 3.0}, increment=True)
+        balances = self._balances()
+        self.assertEqual(len(balances), 1, "increments must hit a single line")
+        self.assertAlmostEqual(balances.quantity, 8.0)
+
+        BoxTypeProduct._update_balances({(self.customer.id, self.box.id): 2.0})
+        self.assertAlmostEqual(self._balances().quantity, 2.0)
+
+    def test_validation_applies_delta_and_rebuild_matches(self):
+        picking = self.env['stock.picking'].create({
+            'partner_id': self.customer.id,
+            'picking_type_id': self.env.ref('stock.picking_type_out').id,
+            'move_ids': [(0, 0, {
+                'name': self.box.name,
+                'product_id': self.box.id,
+                'product_uom_qty': 4.0,
+                'product_uom': self.box.uom_id.id,
+                'location_id': self.env.ref('stock.stock_location_stock').id,
+                'location_dest_id': self.env.ref('stock.stock_location_customers').id,
+            })],
+        })
+        picking.action_confirm()
+        picking.move_ids.quantity = 4.0
+        picking.move_ids.picked = True
+        picking.button_validate()
+        self.assertEqual(picking.state, 'done')
+        self.assertAlmostEqual(self._balances().quantity, 4.0)
+
+        # a stale balance is repaired by the rebuild
+        self._balances().quantity = 42.0
+        self.env['box.type.product']._rebuild_balances(self.customer.ids)
+        self.assertAlmostEqual(self._balances().quantity, 4.0)
@@ -0,0 +1,48 @@
+from datetime import date
+
+from odoo import Command
+from odoo.tests import tagged
+
+from .common import DailyJournalCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCommissionRollup(DailyJournalCommon):
+
+    def _rollups(self, **domain):
+        return self.env['daily.journal.commission.rollup'].search([
+            (name, '=', value) for name, value in domain.items()
+        ])
+
+    def test_journal_rollup_follows_moved_lines(self):
+        Rollup = self.env['daily.journal.commission.rollup']
+        line = self._create_line(date=date(2024, 5, 1))
+        Rollup._refresh(full=True)
+        rollup = self._rollups(source='journal', date=date(2024, 5, 1), customer_id=self.customer.id)
+        self.assertEqual(rollup.line_count, 1)
+        self.assertAlmostEqual(rollup.quantity, 10.0)
+        self.assertAlmostEqual(rollup.commission_amount, 20.0)
+
+        line.date = date(2024, 5, 2)
+        Rollup._refresh()
+        self.assertFalse(self._rollups(source='journal', date=date(2024, 5, 1)),
+                         "the old day of a moved line must be refreshed")
+        self.assertEqual(self._rollups(source='journal', date=date(2024, 5, 2)).line_count, 1)
+
+    def test_sale_rollup_uses_local_date(self):
+        self.env.company.partner_id.tz = 'Africa/Cairo'
+        self.env['sale.order'].create({
+            'partner_id': self.customer.id,
+            # 2024-05-02 in Cairo
+            'date_order': '2024-05-01 22:30:00',
+            'order_line': [Command.create({
+                'product_id': self.product.id,
+                'product_uom_qty': 1.0,
+                'price_unit': 10.0,
+                'outgoing': 3,
+            })],
+        })
+        self.env['daily.journal.commission.rollup']._refresh(full=True)
+        rollup = self._rollups(source='sale', customer_id=self.customer.id)
+        self.assertEqual(rollup.date, date(2024, 5, 2))
+        self.assertAlmostEqual(rollup.commission_result, 6.0)
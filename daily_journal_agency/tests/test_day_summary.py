@@ -0,0 +1,39 @@
+from datetime import date
+
+from odoo.tests import tagged
+
+from .common import DailyJournalCommon
+
+
+@tagged('post_install', '-at_install')
+class TestDaySummary(DailyJournalCommon):
+
+    def _row(self, summary, section, partner):
+        return next(row for row in summary[section] if row['id'] == partner.id)
+
+    def test_summary_totals(self):
+        day = date(2024, 5, 1)
+        self._create_line(date=day, quantity=10.0, price_unit=5.0, box_type_qty=2.0)
+        self._create_line(date=day, quantity=4.0, price_unit=2.5, box_type_qty=1.0)
+        self._create_line(date=date(2024, 5, 2))
+
+        Journal = self.env['daily.journal.agency']
+        customer = self._row(Journal.get_day_summary(day), 'customers', self.customer)
+        self.assertEqual(customer['lines'], 2)
+        self.assertAlmostEqual(customer['quantity'], 14.0)
+        self.assertAlmostEqual(customer['boxes'], 3.0)
+        self.assertAlmostEqual(customer['value'], 60.0)
+        self.assertAlmostEqual(customer['commission'], 28.0)
+        farmer = self._row(Journal.get_day_summary(day), 'farmers', self.farmer)
+        self.assertAlmostEqual(farmer['value'], 60.0)
+
+    def test_summary_follows_changes(self):
+        day = date(2024, 5, 1)
+        line = self._create_line(date=day)
+        Journal = self.env['daily.journal.agency']
+        self.assertAlmostEqual(self._row(Journal.get_day_summary(day), 'customers', self.customer)['value'], 50.0)
+        line.price_unit = 6.0
+        self.assertAlmostEqual(self._row(Journal.get_day_summary(day), 'customers', self.customer)['value'], 60.0)
+        line.unlink()
+        self._create_line(date=day, price_unit=1.0)
+        self.assertAlmostEqual(self._row(Journal.get_day_summary(day), 'customers', self.customer)['value'], 10.0)
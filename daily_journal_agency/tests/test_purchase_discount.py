@@ -0,0 +1,77 @@
+from odoo import Command
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestPurchaseDiscount(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.product_a.purchase_method = 'purchase'
+        cls.product_b.purchase_method = 'purchase'
+
+    def _create_order(self, discount_type='percent', discount_rate=8.0):
+        return self.env['purchase.order'].create({
+            'partner_id': self.partner_a.id,
+            'discount_type': discount_type,
+            'discount_rate': discount_rate,
+            'order_line': [
+                Command.create({'product_id': self.product_a.id, 'product_qty': 6.0,
+                                'price_unit': 100.0, 'taxes_id': False}),
+                Command.create({'product_id': self.product_b.id, 'product_qty': 4.0,
+                                'price_unit': 100.0, 'taxes_id': False}),
+            ],
+        })
+
+    def _create_bill(self, order):
+        order.button_confirm()
+        order.action_create_invoice()
+        return order.invoice_ids
+
+    def test_order_totals(self):
+        order = self._create_order('percent', 8.0)
+        self.assertAlmostEqual(order.amount_untaxed, 920.0)
+        self.assertAlmostEqual(order.tax_totals['amount_untaxed'], 920.0)
+
+        order.write({'discount_type': 'amount', 'discount_rate': 50.0})
+        self.assertAlmostEqual(order.amount_untaxed, 950.0)
+        self.assertAlmostEqual(order.tax_totals['amount_untaxed'], 950.0)
+
+    def test_tax_totals_not_shared(self):
+        order = self._create_order()
+        order.tax_totals['amount_untaxed'] = 0.0
+        order.invalidate_recordset(['tax_totals'])
+        self.assertAlmostEqual(order.tax_totals['amount_untaxed'], 920.0)
+
+    def test_bill_percent_discount(self):
+        bill = self._create_bill(self._create_order('percent', 8.0))
+        self.assertEqual(bill.invoice_line_ids.mapped('discount'), [8.0, 8.0])
+        self.assertTrue(all(bill.invoice_line_ids.mapped('purchase_discount_applied')))
+
+    def test_bill_keeps_hand_set_discount(self):
+        bill = self._create_bill(self._create_order('percent', 8.0))
+        line_a, line_b = bill.invoice_line_ids
+        line_a.discount = 0.0
+        bill.discount_rate = 5.0
+        self.assertEqual(line_a.discount, 0.0, "a discount set by hand, even to 0%, is kept")
+        self.assertEqual(line_b.discount, 5.0)
+
+    def test_bill_amount_discount_prorated_on_order(self):
+        bill = self._create_bill(self._create_order('amount', 100.0))
+        self.assertEqual(bill.invoice_line_ids.mapped('discount'), [10.0, 10.0])
+        # partial bill: the order discount is still spread over the whole order
+        bill.invoice_line_ids[1].unlink()
+        bill.discount_rate = 100.0
+        self.assertAlmostEqual(bill.invoice_line_ids.discount, 10.0)
+
+    def test_manual_bill_not_discounted(self):
+        bill = self.env['account.move'].create({
+            'move_type': 'in_invoice',
+            'partner_id': self.partner_a.id,
+            'invoice_date': '2024-05-01',
+            'discount_rate': 8.0,
+            'invoice_line_ids': [Command.create({'product_id': self.product_a.id, 'price_unit': 100.0})],
+        })
+        self.assertEqual(bill.invoice_line_ids.discount, 0.0)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# error lines kept for the report, the count is always exact
+MAX_ERRORS = 1000
+# day 0 of the Excel (1900 date system) serial dates
+EXCEL_EPOCH = date(1899, 12, 30)
+
+
+class DailyJournalImport(models.TransientModel):
+    _name = 'daily.journal.import'
+    _description = 'Daily Journal Import'
+    # queued imports run on the cron worker, their progress writes keep
+    # them from being vacuumed while running
+    _transient_max_hours = 24.0
+
+    file = fields.Binary(required=True, attachment=True)
+    filename = fields.Char()
+    chunk_size = fields.Integer(default=2000, required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], default='draft')
+    rows_done = fields.Integer(string="Rows Processed", readonly=True,
+                               help="Checkpoint: rows of the file already imported or rejected.")
+    rows_imported = fields.Integer(readonly=True)
+    rows_failed = fields.Integer(readonly=True)
+    duration = fields.Float(string="Duration (s)", readonly=True)
+    throughput = fields.Float(string="Rows per Second", readonly=True)
+    error_log = fields.Text(readonly=True)
+
+    # file column (journal field) -> code model
+    _code_columns = {
+        'customer_code': 'customer.codes',
+        'farmer_code': 'farmer.codes',
+        'product_code': 'product.code',
+    }
+    _float_columns = ('box_type_qty', 'quantity', 'price_unit')
+
+    def _open_file(self):
+        """Binary stream of the uploaded file, read from the filestore
+        instead of decoding the whole field in memory."""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_("The file to import is missing."))
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw)
+
+    def _iter_rows(self):
+        """Yield (row number, {column: value}) without loading the whole
+        sheet: csv reader over the file, or a read-only openpyxl workbook."""
+        if (self.filename or '').lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError(_("Importing XLSX files requires the openpyxl library."))
+            workbook = openpyxl.load_workbook(self._open_file(), read_only=True, data_only=True)
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(column or '').strip().lower() for column in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                if any(value not in (None, '') for value in values):
+                    yield number, dict(zip(header, values))
+            workbook.close()
+        else:
+            with io.TextIOWrapper(self._open_file(), encoding='utf-8-sig', newline='') as file:
+                reader = csv.DictReader(file)
+                reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames or []]
+                for number, row in enumerate(reader, start=2):
+                    if any(row.values()):
+                        yield number, row
+
+    def _iter_chunks(self, skip=0):
+        """Chunks of rows, after the first `skip` rows (already processed)."""
+        chunk = []
+        for index, row in enumerate(self._iter_rows()):
+            if index < skip:
+                continue
+            chunk.append(row)
+            if len(chunk) >= max(self.chunk_size, 1):
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _resolve(self, resolved, model, codes):
+        """Complete `resolved` ({code: (id, target id)}) with the unseen
+        `codes` of the model, in one query."""
+        missing = {code for code in codes if code and code not in resolved}
+        if missing:
+            target_field = self.env[model]._code_target_field
+            rows = self.env[model].search_read([('code', 'in', list(missing))], ['code', target_field], load=None)
+            for row in rows:
+                resolved[row['code']] = (row['id'], row[target_field])
+            # remember the unknown codes too, so they are not searched again
+            resolved.update((code, False) for code in missing if code not in resolved)
+
+    def _resolve_box_types(self, resolved, names):
+        missing = {name for name in names if name and name not in resolved}
+        if missing:
+            box_types = self.env['product.product'].search_read([
+                ('categ_id.is_service', '=', True),
+                '|', ('default_code', 'in', list(missing)), ('name', 'in', list(missing)),
+            ], ['default_code', 'name'])
+            for box_type in box_types:
+                for key in (box_type['default_code'], box_type['name']):
+                    if key in missing:
+                        resolved.setdefault(key, box_type['id'])
+            resolved.update((name, False) for name in missing if name not in resolved)
+
+    def _prepare_journal_vals(self, row, resolved):
+        """Journal values of a file row, or raise ValueError with the reason."""
+        vals = {}
+        for column, model in self._code_columns.items():
+            code = str(row.get(column) or '').strip()
+            if not code:
+                raise ValueError(_("missing %s", column))
+            if not resolved[model].get(code):
+                raise ValueError(_("unknown %(column)s '%(code)s'", column=column, code=code))
+            code_id, target_id = resolved[model][code]
+            if not target_id:
+                # the journal needs the partner/product behind the code
+                raise ValueError(_("%(column)s '%(code)s' has no %(target)s", column=column, code=code,
+                                   target=self.env[model]._code_target_field))
+            vals[column] = code_id
+
+        box_type = str(row.get('box_type') or '').strip()
+        if not box_type:
+            raise ValueError(_("missing box_type"))
+        if not resolved['box_type'].get(box_type):
+            raise ValueError(_("unknown box_type '%s'", box_type))
+        vals['box_type'] = resolved['box_type'][box_type]
+
+        for column in self._float_columns:
+            if row.get(column) not in (None, ''):
+                try:
+                    vals[column] = float(row[column])
+                except (TypeError, ValueError):
+                    raise ValueError(_("invalid %(column)s '%(value)s'", column=column, value=row[column]))
+        if row.get('number_of_boxes') not in (None, ''):
+            try:
+                vals['number_of_boxes'] = int(float(row['number_of_boxes']))
+            except (TypeError, ValueError):
+                raise ValueError(_("invalid number_of_boxes '%s'", row['number_of_boxes']))
+
+        if row.get('date') not in (None, ''):
+            vals['date'] = self._parse_date(row['date'])
+        return vals
+
+    def _parse_date(self, value):
+        """Date of a cell: datetime/date cells, Excel serial numbers or
+        ISO strings; raise ValueError with the reason otherwise."""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        try:
+            if isinstance(value, (int, float)):
+                return EXCEL_EPOCH + timedelta(days=int(value))
+            return fields.Date.to_date(str(value).strip())
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(_("invalid date '%s'", value))
+
+    def _create_rows(self, Journal, rows):
+        """Create the journal lines of `rows` ([(row number, vals)]) in one
+        batch; when it fails, create them one by one to report the failing
+        rows. Return (imported, [(row number, error)])."""
+        try:
+            with self.env.cr.savepoint():
+                Journal.create([vals for __, vals in rows])
+            return len(rows), []
+        except Exception:
+            pass
+        imported, errors = 0, []
+        for number, vals in rows:
+            try:
+                with self.env.cr.savepoint():
+                    Journal.create([vals])
+                imported += 1
+            except Exception as e:
+                errors.append((number, e))
+        return imported, errors
+
+    def action_import(self):
+        """Queue the import on the cron worker: large files would exceed the
+        request time limit."""
+        self.ensure_one()
+        self.write({'state': 'queued'})
+        self.env.ref('daily_journal_agency.ir_cron_daily_journal_import')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    @api.model
+    def _cron_process_imports(self):
+        # running imports were interrupted (worker killed): resume them
+        for wizard in self.search([('state', 'in', ('queued', 'running'))], order='id'):
+            wizard = wizard.with_user(wizard.create_uid)
+            try:
+                wizard._run()
+            except Exception as e:
+                if getattr(threading.current_thread(), 'testing', False):
+                    raise
+                self.env.cr.rollback()
+                _logger.exception("Daily journal import %s failed", wizard.id)
+                wizard.write({
+                    'state': 'done',
+                    'error_log': "\n".join(filter(None, [wizard.error_log, _("Import failed: %s", e)])),
+                })
+                self.env.cr.commit()
+
+    def _run(self):
+        """Import the file chunk by chunk, committing after each chunk. The
+        `rows_done` checkpoint lets an interrupted import resume after its
+        last committed chunk."""
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Journal = self.env['daily.journal.agency'].with_context(
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+            copy_last_line=False,
+        )
+        resolved = {model: {} for model in self._code_columns.values()}
+        resolved['box_type'] = {}
+        errors = self.error_log.splitlines() if self.error_log else []
+        self.state = 'running'
+
+        for chunk in self._iter_chunks(skip=self.rows_done):
+            start = time.perf_counter()
+            for column, model in self._code_columns.items():
+                self._resolve(resolved[model], model, {str(row.get(column) or '').strip() for __, row in chunk})
+            self._resolve_box_types(resolved['box_type'], {str(row.get('box_type') or '').strip() for __, row in chunk})
+
+            rows = []
+            row_errors = []
+            for number, row in chunk:
+                try:
+                    rows.append((number, self._prepare_journal_vals(row, resolved)))
+                except ValueError as e:
+                    row_errors.append((number, e))
+            imported = 0
+            if rows:
+                imported, create_errors = self._create_rows(Journal, rows)
+                row_errors += create_errors
+            for number, error in row_errors:
+                if len(errors) < MAX_ERRORS:
+                    errors.append(_("Row %(number)s: %(error)s", number=number, error=error))
+
+            duration = self.duration + time.perf_counter() - start
+            rows_done = self.rows_done + len(chunk)
+            self.write({
+                'rows_done': rows_done,
+                'rows_imported': self.rows_imported + imported,
+                'rows_failed': self.rows_failed + len(row_errors),
+                'duration': duration,
+                'throughput': rows_done / duration if duration else 0.0,
+                'error_log': "\n".join(errors),
+            })
+            if auto_commit:
+                self.env.cr.commit()
+            # keep memory bounded: the created records are not needed anymore
+            self.env.invalidate_all()
+            _logger.info("Daily journal import %s: %s rows imported, %s failed",
+                         self.id, self.rows_imported, self.rows_failed)
+
+        if self.rows_failed > len(errors):
+            errors.append(_("... and %s more errors.", self.rows_failed - len(errors)))
+        self.write({'state': 'done', 'error_log': "\n".join(errors)})
+        self.env['bus.bus']._sendone(self.env.user.partner_id, 'simple_notification', {
+            'title': _("Daily journal import"),
+            'message': _("%(imported)s rows imported, %(failed)s failed.",
+                         imported=self.rows_imported, failed=self.rows_failed),
+            'type': 'warning' if self.rows_failed else 'success',
+        })
+        if auto_commit:
+            self.env.cr.commit()
@@ -1,5 +1,5 @@
 from odoo import models, fields, api
-from odoo.tools import formatLang
+from odoo.tools import create_index, formatLang
 
 
 class ProductCategory(models.Model):
@@ -11,6 +11,94 @@ class ProductCategory(models.Model):
 
 
 
+class AccountTax(models.Model):
+    _inherit = 'account.tax'
+
+    def _sale_line_tax_memo(self):
+        """Per-transaction memo of sale lines tax results, so that the line
+        amounts, the order tax totals widget and the invoicing flow compute
+        each line's taxes once. Cleared at commit/rollback."""
+        return self.env.cr.precommit.data.setdefault('sale_order_commission.line_taxes', {})
+
+    def _sale_line_tax_signature(self):
+        """Values of the taxes (group children included) and of their
+        repartition lines read by the tax engine. Read from the ORM cache,
+        which a savepoint rollback clears, so a memoized result computed
+        with rolled back tax values is never matched again."""
+        return tuple(
+            (tax.id, tax.amount_type, tax.amount, tax.price_include, tax.include_base_amount,
+             tax.is_base_affected, tax.sequence, tax.company_id.id,
+             tuple(
+                 (line.id, line.repartition_type, line.document_type, line.factor_percent,
+                  line.account_id.id, tuple(line.tag_ids.ids), line.use_in_tax_closing)
+                 for line in tax.invoice_repartition_line_ids | tax.refund_repartition_line_ids
+             ))
+            for tax in self.flatten_taxes_hierarchy()
+        )
+
+    def _compute_taxes_for_single_line(self, base_line, handle_price_include=True, include_caba_tags=False,
+                                       early_pay_discount_computation=None, early_pay_discount_percentage=None):
+        kwargs = {
+            'handle_price_include': handle_price_include,
+            'include_caba_tags': include_caba_tags,
+            'early_pay_discount_computation': early_pay_discount_computation,
+            'early_pay_discount_percentage': early_pay_discount_percentage,
+        }
+        record = base_line.get('record')
+        if not isinstance(record, models.BaseModel) or record._name != 'sale.order.line':
+            return super()._compute_taxes_for_single_line(base_line, **kwargs)
+
+        # Keyed on the effective arguments and the line's own company, so
+        # the lines amounts (called with the company and explicit keywords)
+        # and the tax totals (default company, default keywords) share it.
+        company = record.company_id or self.env.company
+        key = (
+            record.id,
+            company.id,
+            company.tax_calculation_rounding_method,
+            base_line['price_unit'],
+            base_line['quantity'],
+            base_line['discount'],
+            base_line['taxes']._origin._sale_line_tax_signature(),
+            base_line['currency'].id,
+            base_line['product'].id,
+            base_line['partner'].id,
+            base_line['is_refund'],
+            base_line['handle_price_include'],
+            base_line.get('rate'),
+            repr(sorted(base_line.get('extra_context', {}).items())),
+            tuple(kwargs.values()),
+        )
+        memo = self._sale_line_tax_memo()
+        if key not in memo:
+            memo[key] = super(AccountTax, self.with_company(company))._compute_taxes_for_single_line(
+                base_line, **kwargs)
+        to_update_vals, tax_values_list = memo[key]
+        return dict(to_update_vals), [dict(tax_values) for tax_values in tax_values_list]
+
+    def write(self, vals):
+        # a tax change invalidates every memoized result
+        self._sale_line_tax_memo().clear()
+        return super().write(vals)
+
+
+class AccountTaxRepartitionLine(models.Model):
+    _inherit = 'account.tax.repartition.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['account.tax']._sale_line_tax_memo().clear()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env['account.tax']._sale_line_tax_memo().clear()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['account.tax']._sale_line_tax_memo().clear()
+        return super().unlink()
+
+
 class SaleOrderLine(models.Model):
     _inherit = 'sale.order.line'
 
@@ -25,57 +113,62 @@ class SaleOrderLine(models.Model):
 
     @api.depends('product_uom_qty', 'discount', 'price_unit', 'tax_id', 'commission_result')
     def _compute_amount(self):
-        for line in self:
-            taxes_res = self.env['account.tax'].with_company(line.company_id)._compute_taxes(
-                [line._convert_to_tax_base_line_dict()]
+        # one tax engine call per company instead of one per line
+        for company, lines in self.grouped('company_id').items():
+            taxes_res = self.env['account.tax'].with_company(company)._compute_taxes(
+                [line._convert_to_tax_base_line_dict() for line in lines]
             )
-            totals = list(taxes_res['totals'].values())[0]
-            amount_untaxed = totals['amount_untaxed'] + line.commission_result
-            amount_tax = totals['amount_tax']
-            amount_total = amount_untaxed + amount_tax
+            for base_line, to_update in taxes_res['base_lines_to_update']:
+                line = base_line['record']
+                amount_untaxed = to_update['price_subtotal'] + line.commission_result
+                amount_tax = to_update['price_total'] - to_update['price_subtotal']
+                amount_total = amount_untaxed + amount_tax
 
-            line.update({
-                'price_subtotal': amount_untaxed,
-                'price_tax': amount_tax,
-                'price_total': amount_total,
-            })
+                line.update({
+                    'price_subtotal': amount_untaxed,
+                    'price_tax': amount_tax,
+                    'price_total': amount_total,
+                })
+
+    def _prepare_invoice_line(self, **optional_values):
+        """Create the invoice lines with their commission, instead of
+        writing it on the draft invoice afterwards."""
+        res = super()._prepare_invoice_line(**optional_values)
+        res.update({
+            'commission_result': self.commission_result,
+            'commission_value': self.commission_value,
+            'outgoing': self.outgoing,
+        })
+        return res
 
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
 
+    commission_total = fields.Monetary(string="Total Commission", compute='_compute_commission_totals', store=True)
+    outgoing_total = fields.Integer(string="Total Outgoing", compute='_compute_commission_totals', store=True)
+
+    def init(self):
+        create_index(self._cr, 'sale_order_date_order_partner_id_idx', self._table, ['date_order', 'partner_id'])
+
+    @api.depends('order_line.commission_result', 'order_line.outgoing')
+    def _compute_commission_totals(self):
+        for order in self:
+            order.commission_total = sum(order.order_line.mapped('commission_result'))
+            order.outgoing_total = sum(order.order_line.mapped('outgoing'))
 
     @api.depends_context('lang')
     @api.depends('order_line.tax_id', 'order_line.price_unit', 'order_line.commission_result',
                  'order_line.product_uom_qty', 'currency_id')
     def _compute_tax_totals(self):
         for order in self:
+            # same memo keys as _compute_amount: the lines taxes are not recomputed
             order_lines = order.order_line.filtered(lambda x: not x.display_type)
             order.tax_totals = self.env['account.tax']._prepare_tax_totals(
                 [x._convert_to_tax_base_line_dict() for x in order_lines],
                 order.currency_id or order.company_id.currency_id,
             )
-            order.tax_totals['amount_untaxed'] += sum(order_lines.mapped('commission_result'))
-
-    def _create_invoices(self, grouped=False, final=False, date=None):
-        invoices = super()._create_invoices(grouped=grouped, final=final, date=date)
-
-        for order in self:
-            invoice = order.invoice_ids.filtered(lambda inv: inv.state == 'draft')
-            for line in order.order_line:
-                invoice_line = invoice.invoice_line_ids.filtered(
-                    lambda l: l.sale_line_ids and l.sale_line_ids[0] == line)
-                if invoice_line:
-                    invoice_line.write({
-                        'commission_result': line.commission_result,
-                        'commission_value': line.commission_value,
-                        'outgoing': line.outgoing,
-                        'price_subtotal': line.price_subtotal,
-                        'price_total': line.price_total
-                    })
-
-
-        return invoices
+            order.tax_totals['amount_untaxed'] += order.commission_total
 
 class AccountMove(models.Model):
     _inherit = 'account.move'
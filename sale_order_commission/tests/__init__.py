@@ -0,0 +1 @@
+from . import test_sale_line_tax_memo
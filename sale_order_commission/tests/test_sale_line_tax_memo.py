@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.addons.account.models.account_tax import AccountTax
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSaleLineTaxMemo(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tax = cls.env['account.tax'].create({
+            'name': "Tax 15%",
+            'amount': 15.0,
+            'type_tax_use': 'sale',
+        })
+        category = cls.env['product.category'].create({'name': "Vegetables", 'commission_value': 2})
+        cls.product = cls.env['product.product'].create({'name': "Tomatoes", 'categ_id': category.id})
+        cls.order = cls.env['sale.order'].create({
+            'partner_id': cls.env['res.partner'].create({'name': "Customer"}).id,
+            'order_line': [Command.create({
+                'product_id': cls.product.id,
+                'product_uom_qty': 10.0,
+                'price_unit': 100.0,
+                'outgoing': 3,
+                'tax_id': [Command.set(cls.tax.ids)],
+            })],
+        })
+
+    def _patch_compute_all(self):
+        return patch.object(AccountTax, 'compute_all', autospec=True, side_effect=AccountTax.compute_all)
+
+    def test_tax_totals_reuse_line_taxes(self):
+        self.env['account.tax']._sale_line_tax_memo().clear()
+        with self._patch_compute_all() as compute_all:
+            self.order.order_line._compute_amount()
+            self.assertEqual(compute_all.call_count, 1)
+            self.order._compute_tax_totals()
+            self.assertEqual(compute_all.call_count, 1, "the tax totals should reuse the line taxes")
+
+        line = self.order.order_line
+        self.assertAlmostEqual(line.price_subtotal, 1000.0 + line.commission_result)
+        self.assertAlmostEqual(line.price_tax, 150.0)
+        self.assertAlmostEqual(self.order.tax_totals['amount_untaxed'], 1000.0 + self.order.commission_total)
+
+    def test_tax_change_recomputes(self):
+        self.order.order_line._compute_amount()
+        self.tax.amount = 20.0
+        with self._patch_compute_all() as compute_all:
+            self.order.order_line._compute_amount()
+            self.assertEqual(compute_all.call_count, 1)
+        self.assertAlmostEqual(self.order.order_line.price_tax, 200.0)
+
+    def test_repartition_change_clears_memo(self):
+        self.order.order_line._compute_amount()
+        self.assertTrue(self.env['account.tax']._sale_line_tax_memo())
+        self.tax.invoice_repartition_line_ids.filtered(lambda line: line.repartition_type == 'tax').write({
+            'factor_percent': 50.0,
+        })
+        self.assertFalse(self.env['account.tax']._sale_line_tax_memo())
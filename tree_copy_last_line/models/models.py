@@ -1,5 +1,97 @@
 # -*- coding: utf-8 -*-
-from odoo import models, api, fields
+import copy
+import threading
+from collections import OrderedDict, defaultdict
+
+from odoo import models, api, fields, tools
+from odoo.tools import SQL
+
+
+class LastLineCache:
+    """
+    Small thread-safe LRU mapping a "last line" lookup key
+    (dbname, uid, model, domain) to the id of the last record and its
+    prepared copy values.
+
+    Entries are trusted until the mixin invalidates them: refreshed on
+    create/write of the last record, discarded on unlink and rollback.
+    Reverse indexes by record and by domain keep those invalidations
+    proportional to the affected entries instead of the cache size.
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # (dbname, model, record id) -> keys, (dbname, model, domain) -> keys
+        self._by_record = defaultdict(set)
+        self._by_domain = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, record_id, vals):
+        dbname, __, model, domain = key
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (record_id, vals)
+            self._by_record[dbname, model, record_id].add(key)
+            self._by_domain[dbname, model, domain].add(key)
+            while len(self._entries) > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            dbname, __, model, domain = key
+            for index, index_key in ((self._by_record, (dbname, model, entry[0])),
+                                     (self._by_domain, (dbname, model, domain))):
+                index[index_key].discard(key)
+                if not index[index_key]:
+                    del index[index_key]
+
+    def keys_for_records(self, dbname, model, record_ids):
+        """Keys whose cached last line is one of `record_ids`."""
+        with self._lock:
+            return [
+                key
+                for record_id in record_ids
+                for key in self._by_record.get((dbname, model, record_id), ())
+            ]
+
+    def keys_for_domain(self, dbname, model, domain):
+        """Keys of all users for `domain`."""
+        with self._lock:
+            return list(self._by_domain.get((dbname, model, domain), ()))
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self, dbname):
+        with self._lock:
+            self.discard([key for key in self._entries if key[0] == dbname])
+
+
+last_line_cache = LastLineCache()
+
+
+# Converters from `read(load=None)` values to create/default_get values
+def _copy_many2one(value):
+    return value or False
+
+
+def _copy_many2many(value):
+    return [(6, 0, list(value))]
+
+
+def _copy_json(value):
+    return dict(value) if isinstance(value, dict) else (value or {})
 
 
 class AutoCopyLastLineMixin(models.AbstractModel):
@@ -11,21 +103,33 @@ class AutoCopyLastLineMixin(models.AbstractModel):
 
     Behavior:
       - Chooses the "last line" constrained by parent M2O defaults if present
-        (e.g., default_order_id for one2many), otherwise falls back to the
-        last record created by the current user.
+        (e.g., default_order_id for one2many) or by the parent fields given
+        in the created values, otherwise falls back to the last record
+        created by the current user.
+      - A batch create spanning several parents fills each group of values
+        from its own parent's last line, all fetched in one query.
       - Copies only safe field types by default (scalars, M2O, M2M, JSON).
       - Skips non-stored computed fields and common technical fields.
 
+    The copy values of the last line of each (user, domain) are kept in a
+    bounded LRU cache, refreshed on create/write and dropped on unlink or
+    rollback, so typing a new line does not search for the previous one
+    every time.
+
     Enable/disable:
       - Context key `copy_last_line` (default: True).
     Customize:
       - Set `__copy_last_line_fields__` in the inheriting model for a whitelist.
+      - Set `__copy_last_line_parent_fields__` to the M2O fields identifying
+        the parent of a line (e.g. ["order_id"]).
     """
     _name = "auto.copy.last.line.mixin"
     _description = "Auto copy last line defaults (form + inline create)"
 
     # Optional whitelist. If None, a safe auto-selection is used.
     __copy_last_line_fields__ = None
+    # Optional M2O fields grouping lines by parent, besides `default_<m2o>`.
+    __copy_last_line_parent_fields__ = None
 
     # -----------------------------
     # Configuration helpers
@@ -34,24 +138,87 @@ class AutoCopyLastLineMixin(models.AbstractModel):
         """Check if feature is enabled for this request (context flag)."""
         return self.env.context.get("copy_last_line", True)
 
-    def _copy_last_line_domain(self):
+    def _copy_last_line_parent_fields(self):
+        """M2O fields identifying the parent of a line: the declared ones and
+        those with a `default_<m2o>` in context."""
+        ctx = self.env.context
+        parents = [f for f in self.__copy_last_line_parent_fields__ or () if f in self._fields]
+        for name, field in self._fields.items():
+            if isinstance(field, fields.Many2one) and name not in parents:
+                if ctx.get(f"default_{name}"):
+                    parents.append(name)
+        return parents
+
+    def _copy_last_line_domain(self, vals=None, parent_fields=None):
         """
         Build a domain to pick the "last line" to copy from:
-          - If any `default_<m2o>` is present in context, constrain on it
-            (this captures the one2many parent).
+          - If a parent M2O is set in `vals` or as `default_<m2o>` in
+            context, constrain on it (this captures the one2many parent).
           - Else, constrain by `create_uid = current user` (list view fallback).
         """
         ctx = self.env.context
+        if parent_fields is None:
+            parent_fields = self._copy_last_line_parent_fields()
         domain = []
-        for name, field in self._fields.items():
-            if isinstance(field, fields.Many2one):
-                key = f"default_{name}"
-                if key in ctx and ctx[key]:
-                    domain.append((name, "=", ctx[key]))
+        for name in parent_fields:
+            value = (vals or {}).get(name) or ctx.get(f"default_{name}")
+            if value:
+                domain.append((name, "=", value))
         if not domain:
             domain = [("create_uid", "=", self.env.user.id)]
         return domain
 
+    def _copy_last_line_cache_key(self, domain):
+        # per user: the values are read with the user's field access
+        return (self.env.cr.dbname, self.env.uid, self._name, tuple(map(tuple, domain)))
+
+    def _get_last_line_values(self, domain):
+        """
+        Copy values of the last record matching `domain`, from the cache
+        when possible. Returns an empty dict when there is no such record.
+        """
+        return self._get_last_lines_values([domain])[0]
+
+    def _get_last_lines_values(self, domains):
+        """
+        Copy values of the last record matching each domain of `domains`
+        (same order). Cache misses are resolved together: one query picking
+        the last id of every domain, and one read of the planned columns.
+        """
+        plan = self._get_copy_plan()
+        if not plan:
+            return [{} for __ in domains]
+        keys = [self._copy_last_line_cache_key(domain) for domain in domains]
+        entries = {key: last_line_cache.get(key) for key in keys}
+        missing = [(key, domain) for key, domain in zip(keys, domains) if entries[key] is None]
+
+        if missing:
+            self.flush_model()
+            queries = [
+                SQL("SELECT %s, last.id FROM %s AS last", idx, self._search(domain, order="id desc", limit=1).subselect())
+                for idx, (__, domain) in enumerate(missing)
+            ]
+            self.env.cr.execute(SQL(" UNION ALL ").join(queries))
+            last_ids = dict(self.env.cr.fetchall())
+            found = [(key, last_ids[idx]) for idx, (key, __) in enumerate(missing) if idx in last_ids]
+            if found:
+                self._cache_last_lines([key for key, __ in found], self.browse([last_id for __, last_id in found]))
+                entries.update((key, last_line_cache.get(key)) for key, __ in found)
+
+        # callers may alter the values (e.g. M2M commands): hand out copies
+        return [copy.deepcopy(entries[key][1]) if entries[key] else {} for key in keys]
+
+    def _cache_last_lines(self, keys, lasts):
+        """
+        Store the copy values of `lasts` as the last lines of `keys` (same
+        order), with a single read of the planned columns.
+        """
+        fields_list = [name for name, __ in self._get_copy_plan()]
+        rows = {row["id"]: row for row in lasts.read(fields_list, load=None)}
+        self.env.cr.postrollback.add(lambda dbname=self.env.cr.dbname: last_line_cache.clear(dbname))
+        for key, last in zip(keys, lasts):
+            last_line_cache.put(key, last.id, self._convert_copy_values(rows[last.id]))
+
     def _fields_to_copy(self):
         """
         Determine fields to be copied.
@@ -78,39 +245,59 @@ class AutoCopyLastLineMixin(models.AbstractModel):
                 allowed.append(name)
         return allowed
 
-    def _prepare_copy_values_from_record(self, last, fields_list=None):
+    @tools.ormcache()
+    def _get_copy_plan(self):
         """
-        Convert the source record into create/default_get-friendly values:
+        Copy plan of the model, built once per registry load: a tuple of
+        (field name, converter) for every copied field, where `converter`
+        turns the raw `read(load=None)` value into a create-friendly one
+        (None when the value is used as-is):
           - M2O  -> ID
           - M2M  -> [(6, 0, ids)]
           - JSON -> plain dict (copy)
           - Scalars as-is
-        Non-stored computed fields are skipped.
-        If `fields_list` is provided, restrict to it (used by default_get).
+        Non-stored computed fields are skipped (UI-only, not in DB), and so
+        are related fields: values given to create() would override the
+        value of their new source.
         """
-        vals = {}
-        allowed = set(self._fields_to_copy())
-        if fields_list:
-            allowed &= set(fields_list)
-
-        for name in allowed:
+        plan = []
+        for name in self._fields_to_copy():
             field = self._fields[name]
-
-            # Skip non-stored computed fields (UI-only, not in DB)
-            if getattr(field, "compute", False) and not getattr(field, "store", False):
+            if field.related or (field.compute and not field.store):
                 continue
-
-            value = last[name]
-            if isinstance(field, fields.Many2one):
-                vals[name] = value.id or False
-            elif isinstance(field, fields.Many2many):
-                vals[name] = [(6, 0, value.ids)]
-            elif isinstance(field, fields.Json):
-                vals[name] = dict(value) if isinstance(value, dict) else (value or {})
+            if field.type == "many2one":
+                plan.append((name, _copy_many2one))
+            elif field.type == "many2many":
+                plan.append((name, _copy_many2many))
+            elif field.type == "json":
+                plan.append((name, _copy_json))
             else:
-                vals[name] = value
+                plan.append((name, None))
+        return tuple(plan)
+
+    def _convert_copy_values(self, row, fields_list=None):
+        """
+        Apply the copy plan to a `read(load=None)` row.
+        If `fields_list` is provided, restrict to it (used by default_get).
+        """
+        vals = {}
+        for name, converter in self._get_copy_plan():
+            if fields_list and name not in fields_list:
+                continue
+            vals[name] = converter(row[name]) if converter else row[name]
         return vals
 
+    def _prepare_copy_values_from_record(self, last, fields_list=None):
+        """
+        Convert the source record into create/default_get-friendly values,
+        with a single read of the planned columns.
+        """
+        plan = self._get_copy_plan()
+        if not plan:
+            return {}
+        row = last.read([name for name, __ in plan], load=None)[0]
+        return self._convert_copy_values(row, fields_list)
+
     # -----------------------------
     # Default values (form create)
     # -----------------------------
@@ -124,14 +311,14 @@ class AutoCopyLastLineMixin(models.AbstractModel):
         if not self._is_copy_enabled():
             return res
 
-        last = self.search(self._copy_last_line_domain(), order="id desc", limit=1)
-        if not last:
+        fill_vals = self._get_last_line_values(self._copy_last_line_domain())
+        if not fill_vals:
             return res
 
         # NOTE: This overwrites existing values from super() if present.
         # If you want "fill only empty", replace `res.update(...)`
         # with a selective merge that checks emptiness first.
-        res.update(self._prepare_copy_values_from_record(last, fields_list))
+        res.update({name: value for name, value in fill_vals.items() if name in fields_list})
         return res
 
     # -----------------------------
@@ -146,23 +333,60 @@ class AutoCopyLastLineMixin(models.AbstractModel):
         if not self._is_copy_enabled():
             return super().create(vals_list)
 
-        last = self.search(self._copy_last_line_domain(), order="id desc", limit=1)
-        if not last:
-            return super().create(vals_list)
+        # group the values by parent, each group is filled from its own last line
+        parent_fields = self._copy_last_line_parent_fields()
+        groups = {}
+        for index, vals in enumerate(vals_list):
+            domain = self._copy_last_line_domain(vals, parent_fields)
+            groups.setdefault(tuple(map(tuple, domain)), (domain, []))[1].append(index)
+        domains = [domain for domain, __ in groups.values()]
+        fields_can_fill = [name for name, __ in self._get_copy_plan()]
 
-        fill_vals = self._prepare_copy_values_from_record(last)
-        fields_can_fill = set(self._fields_to_copy())
+        new_vals_list = list(vals_list)
+        for (__, indexes), fill_vals in zip(groups.values(), self._get_last_lines_values(domains)):
+            if not fill_vals:
+                continue
+            for index in indexes:
+                merged = dict(vals_list[index])
+                for f in fields_can_fill:
+                    if f not in merged or merged[f] in (False, None, [], ""):
+                        if f in fill_vals:
+                            merged[f] = fill_vals[f]
+                new_vals_list[index] = merged
 
-        new_vals_list = []
-        for vals in vals_list:
-            merged = dict(vals)
-            for f in fields_can_fill:
-                if f not in merged or merged[f] in (False, None, [], ""):
-                    if f in fill_vals:
-                        merged[f] = fill_vals[f]
-            new_vals_list.append(merged)
+        records = super().create(new_vals_list)
+
+        # The newest record of each group becomes the last line of its
+        # parent, for every user: entries of the other users are dropped.
+        # The new records' values are still in the ORM cache, the read
+        # below does not query them again.
+        if fields_can_fill:
+            dbname = self.env.cr.dbname
+            for domain in domains:
+                last_line_cache.discard(last_line_cache.keys_for_domain(dbname, self._name, tuple(map(tuple, domain))))
+            self._cache_last_lines(
+                [self._copy_last_line_cache_key(domain) for domain in domains],
+                self.browse([records[indexes[-1]].id for __, indexes in groups.values()]),
+            )
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        keys = last_line_cache.keys_for_records(self.env.cr.dbname, self._name, self.ids)
+        if keys:
+            # refresh the cached copy values of the written last lines for
+            # the current user, the other users' are read again when needed
+            own = [key for key in keys if key[1] == self.env.uid]
+            last_line_cache.discard([key for key in keys if key[1] != self.env.uid])
+            entries = [(key, last_line_cache.get(key)) for key in own]
+            entries = [(key, entry[0]) for key, entry in entries if entry is not None]
+            if entries:
+                self._cache_last_lines([key for key, __ in entries], self.browse([last_id for __, last_id in entries]))
+        return res
 
-        return super().create(new_vals_list)
+    def unlink(self):
+        last_line_cache.discard(last_line_cache.keys_for_records(self.env.cr.dbname, self._name, self.ids))
+        return super().unlink()
 
 
 # ------------------------------------------------------------
@@ -177,6 +401,5 @@ class DailyJournalAgency(models.Model):
 
     __copy_last_line_fields__ = [
         "customer_code", "farmer_code", "product_code", "box_type",
-        "quantity", "box_type_qty", "price_unit", "commission_value",
-        "product_id", "date",
+        "quantity", "box_type_qty", "price_unit", "date",
     ]
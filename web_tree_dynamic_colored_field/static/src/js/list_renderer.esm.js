@@ -2,7 +2,53 @@
 
 import {patch} from "@web/core/utils/patch";
 import {ListRenderer} from "@web/views/list/list_renderer";
-import {evaluateBooleanExpr} from "@web/core/py_js/py";
+import {evaluate, parseExpr} from "@web/core/py_js/py";
+
+// AST node type of a bare name in @web/core/py_js/py_parser
+const AST_NAME = 5;
+const X2MANY_TYPES = ["one2many", "many2many"];
+
+/**
+ * Compiled `bg_color`/`fg_color` definitions, keyed by the option string.
+ * Each entry is a list of {color, ast, names}: `ast` is the parsed
+ * `bool(expression)` and `names` the names the expression reads.
+ */
+const compiledDefinitions = new Map();
+
+/**
+ * Last evaluation of every compiled expression, per record:
+ * WeakMap(record -> Map(compiled expression -> {values, result})).
+ */
+const evaluations = new WeakMap();
+
+function collectNames(node, names) {
+    if (Array.isArray(node)) {
+        for (const child of node) {
+            collectNames(child, names);
+        }
+    } else if (node && typeof node === "object") {
+        if (node.type === AST_NAME) {
+            names.add(node.value);
+        }
+        for (const child of Object.values(node)) {
+            collectNames(child, names);
+        }
+    }
+    return names;
+}
+
+function compileExpression(expression) {
+    if (!expression || expression === "False" || expression === "0") {
+        return {constant: false};
+    }
+    if (expression === "True" || expression === "1") {
+        return {constant: true};
+    }
+    return {
+        ast: parseExpr(`bool(${expression})`),
+        names: [...collectNames(parseExpr(expression), new Set())],
+    };
+}
 
 patch(ListRenderer.prototype, {
     /**
@@ -37,27 +83,79 @@ patch(ListRenderer.prototype, {
      */
     getDynamicColor(column, record, color_target) {
         if (color_target in column.options) {
-            const definition = column.options[color_target];
             let result = "";
+            for (const compiled of this.compileColorDefinition(
+                column.options[color_target]
+            )) {
+                if (this.evaluateColorExpression(compiled, record)) {
+                    // We don't return first match,
+                    // as it can be default color (with "True" expression),
+                    // and later more precise condition may be found.
+                    result = compiled.color;
+                }
+            }
+            return result || undefined;
+        }
+    },
+
+    /**
+     * Split and parse a color definition once; later calls with the same
+     * option string reuse the parsed expressions.
+     *
+     * @param {String} definition `color: expression; ...` option string
+     * @returns {Array} list of compiled {color, ast, names} entries
+     */
+    compileColorDefinition(definition) {
+        let compiled = compiledDefinitions.get(definition);
+        if (!compiled) {
+            compiled = [];
             for (const color_def of definition.split(";")) {
                 const color_to_expression = this.pairColorParse(color_def);
                 if (color_to_expression !== undefined) {
                     const [color, expression] = color_to_expression;
-                    if (
-                        evaluateBooleanExpr(
-                            expression,
-                            record.evalContextWithVirtualIds
-                        )
-                    ) {
-                        // We don't return first match,
-                        // as it can be default color (with "True" expression),
-                        // and later more precise condition may be found.
-                        result = color;
-                    }
+                    compiled.push({color, ...compileExpression(expression.trim())});
                 }
             }
-            return result || undefined;
+            compiledDefinitions.set(definition, compiled);
+        }
+        return compiled;
+    },
+
+    /**
+     * Evaluate a compiled expression for a record, reusing the previous
+     * result while the record fields it reads are unchanged.  Expressions
+     * reading anything else (parent, context, x2many lists, ...) are
+     * always evaluated.
+     *
+     * @param {Object} compiled entry from compileColorDefinition
+     * @param {Record} record
+     * @returns {Boolean}
+     */
+    evaluateColorExpression(compiled, record) {
+        if ("constant" in compiled) {
+            return compiled.constant;
+        }
+        const cacheable = compiled.names.every(
+            (name) =>
+                name in record.data &&
+                !X2MANY_TYPES.includes(record.fields[name]?.type)
+        );
+        if (!cacheable) {
+            return evaluate(compiled.ast, record.evalContextWithVirtualIds);
+        }
+        const values = compiled.names.map((name) => record.data[name]);
+        let recordEvaluations = evaluations.get(record);
+        if (!recordEvaluations) {
+            recordEvaluations = new Map();
+            evaluations.set(record, recordEvaluations);
+        }
+        const previous = recordEvaluations.get(compiled);
+        if (previous && previous.values.every((value, i) => value === values[i])) {
+            return previous.result;
         }
+        const result = evaluate(compiled.ast, record.evalContextWithVirtualIds);
+        recordEvaluations.set(compiled, {values, result});
+        return result;
     },
 
     /**